@@ -0,0 +1,196 @@
+# Import packages
+import csv
+import hashlib
+import io
+import json
+
+import flask
+
+from compression import compress_stream, negotiate
+from cube import victims_columns
+
+### AGGREGATES API
+# Read-only HTTP endpoints serving the aggregates behind the dashboard's charts, and the rows
+# they are computed from, as JSON or CSV:
+#
+#   GET /api/aggregates                   the available aggregates
+#   GET /api/aggregates/<name>?years=1990-2000&sex=Male&volunteer=yes&foreign=no&race=White&format=csv
+#   GET /api/executions?years=1990-2000&sex=Male&format=csv
+#
+# Every filter is optional and has the meaning of the dashboard's control of the same name:
+# `years` is the slider range (inclusive, the whole dataset by default), `sex` and `race` the
+# dropdowns, `volunteer` and `foreign` the checkboxes. The aggregates are computed from the
+# dashboard's filtered sub-cubes, so they are the numbers the charts show. The executions are
+# the matching rows of the cleaned dataset, selected with the bitmap engine (see filters.py).
+#
+# Responses carry an ETag derived from the dataset version and the query, so a client sending
+# it back in If-None-Match gets a 304 until the data changes. Bodies are streamed, compressed
+# on the fly with brotli or gzip when the client accepts it.
+
+# Name -> (grouping dimensions, measures, chart it backs)
+aggregates = {
+    'executions-by-state': (['State Code'], ['Executions'], 'choropleth_map'),
+    'sex-race': (['Sex', 'Race'], ['Executions'], 'nested_pie_chart'),
+    'race-year': (['Race', 'Execution Year'], ['Executions'], 'linechart'),
+    'race-victims': (['Race'], victims_columns, 'matrix'),
+    'year-region': (['Execution Year', 'Region'], ['Executions'], 'scatter_fig'),
+    'race-region': (['Race', 'Region'], ['Executions'], 'stackedBar'),
+}
+
+formats = {'json': 'application/json', 'csv': 'text/csv'}
+
+# Rows written per chunk of a streamed body
+ROWS_PER_CHUNK = 1000
+
+
+class QueryError(ValueError):
+    pass
+
+
+def parse_flag(args, name):
+    value = args.get(name, '').strip().lower()
+    if value in ('', '0', 'no', 'false'):
+        return False
+    if value in ('1', 'yes', 'true'):
+        return True
+    raise QueryError(f'{name} must be yes or no, not {value!r}')
+
+
+def parse_choice(args, name, labels):
+    value = args.get(name) or None
+    if value is not None and value not in labels:
+        raise QueryError(f'Unknown {name} {value!r}, expected one of {", ".join(label for label in labels if label)}')
+    return value
+
+
+# Normalized filter state of the request's query string, in the order of `filter_key` in app.py
+def parse_filters(args, cube):
+    years = cube.labels['Execution Year']
+    first, last = years[0], years[-1]
+    if args.get('years'):
+        try:
+            bounds = [int(year) for year in args['years'].split('-')]
+        except ValueError:
+            raise QueryError(f'years must be a year or a range like 1990-2000, not {args["years"]!r}') from None
+        if len(bounds) not in (1, 2):
+            raise QueryError(f'years must be a year or a range like 1990-2000, not {args["years"]!r}')
+        first, last = bounds[0], bounds[-1]
+    sex = parse_choice(args, 'sex', cube.labels['Sex'])
+    race = parse_choice(args, 'race', cube.labels['Race'])
+    return (first, last), sex, race, parse_flag(args, 'volunteer'), parse_flag(args, 'foreign')
+
+
+# Rows of an aggregate for a filter state as a DataFrame
+def aggregate(filtered_cube, name, race):
+    keep, measures, _ = aggregates[name]
+    frame = filtered_cube.select(filters={'Race': race}).frame(keep)
+    if name == 'executions-by-state':
+        # Like the map: federal executions have no state
+        frame = frame[frame['State Code'].notna()]
+    return frame[keep + measures]
+
+
+# JSON-ready values of a column: dates as ISO strings, missing categories as None
+def column_values(series):
+    if series.dtype.kind == 'M':
+        return series.dt.strftime('%Y-%m-%d').tolist()
+    if series.dtype == 'category':
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+# Rows of `frame` as lists of JSON-ready values, ROWS_PER_CHUNK at a time. Only the slice being
+# written is turned into Python objects, so the memory of a response doesn't grow with its rows
+def batched(frame):
+    for start in range(0, len(frame), ROWS_PER_CHUNK):
+        chunk = frame.iloc[start:start + ROWS_PER_CHUNK]
+        yield list(zip(*(column_values(chunk[column]) for column in chunk.columns)))
+
+
+def json_chunks(header, frame):
+    yield json.dumps(dict(header, columns=list(frame.columns)))[:-1] + ', "data": ['
+    separator = ''
+    for batch in batched(frame):
+        yield separator + ', '.join(json.dumps(list(row)) for row in batch)
+        separator = ', '
+    yield ']}'
+
+
+def csv_chunks(frame):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(list(frame.columns))
+    for batch in batched(frame):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def error(status, message):
+    return flask.Response(json.dumps({'error': message}), status=status, mimetype='application/json')
+
+
+# Serve the aggregates on `server`. `current()` returns the dashboard's current dataset and its
+# cube as one snapshot, `filtered_subset(years, sex, volunteer, foreign, cube)` a (cached)
+# filtered sub-cube of the cube and `filtered_rows(years, sex, race, volunteer, foreign, rows)`
+# the matching rows of the dataset
+def init_app(server, current, filtered_subset, filtered_rows):
+
+    # `frame(rows, cube, years, sex, race, volunteer, foreign)` of the request's query, streamed.
+    # The data and the version in the ETag come from the same snapshot, so a reload between the
+    # two can't give a body of one version under the ETag of another
+    def respond(name, frame):
+        output = flask.request.args.get('format', 'json')
+        if output not in formats:
+            return error(400, f'format must be json or csv, not {output!r}')
+        rows, cube = current()
+        version = cube.version
+        try:
+            years, sex, race, volunteer, foreign = parse_filters(flask.request.args, cube)
+        except QueryError as e:
+            return error(400, str(e))
+
+        # The body only depends on the data and the normalized query, so neither is needed to
+        # answer a conditional request
+        etag = hashlib.sha1(repr((version, name, years, sex, race, volunteer, foreign, output)).encode()).hexdigest()
+        if flask.request.if_none_match.contains_weak(etag):
+            response = flask.Response(status=304)
+        else:
+            result = frame(rows, cube, years, sex, race, volunteer, foreign)
+            if output == 'json':
+                header = {'version': version,
+                          'filters': {'years': list(years), 'sex': sex, 'race': race, 'volunteer': volunteer, 'foreign': foreign}}
+                if name in aggregates:
+                    header = {'aggregate': name, **header}
+                chunks = json_chunks(header, result)
+            else:
+                chunks = csv_chunks(result)
+            encoding = negotiate(flask.request)
+            response = flask.Response(compress_stream(chunks, encoding), mimetype=formats[output])
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        # Weak: the gzip, brotli and plain bodies of a query are equivalent, not byte-identical
+        response.set_etag(etag, weak=True)
+        response.vary.add('Accept-Encoding')
+        # Appended data changes the answer, so clients revalidate instead of reusing it blindly
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @server.route('/api/aggregates')
+    def list_aggregates():
+        return flask.jsonify({name: {'dimensions': keep, 'measures': measures, 'chart': chart}
+                              for name, (keep, measures, chart) in aggregates.items()})
+
+    @server.route('/api/aggregates/<name>')
+    def get_aggregate(name):
+        if name not in aggregates:
+            return error(404, f'Unknown aggregate {name!r}')
+        return respond(name, lambda rows, cube, years, sex, race, volunteer, foreign:
+                       aggregate(filtered_subset(years, sex, volunteer, foreign, cube), name, race))
+
+    @server.route('/api/executions')
+    def get_executions():
+        return respond('executions', lambda rows, cube, years, sex, race, volunteer, foreign:
+                       filtered_rows(years, sex, race, volunteer, foreign, rows))
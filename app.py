@@ -1,13 +1,29 @@
 # Import packages
+import collections
+import functools
+import gzip
+import threading
+import time
 import dash
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output
-import plotly.graph_objects as go
-import pandas as pd
+from dash import Patch
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+import flask
 import numpy as np
+import config
+import dataset
 from dataset import df
-import plotly.express as px
+from cube import SubcubeCache, load_cube
+from figure_cache import FigureCache, SQLiteBackend
+from filters import FilterEngine
+import figures
+import metrics
+import api
+import compression
+import static_files
+from precompute import ResponseStore, state_key
 
 ################################### INTERACTIVE COMPONENTS ###################################
 colors = {
@@ -30,13 +46,20 @@ footer_style = {
 }
 
 emoji = "🇺🇸"
+
+
+# Slider marks: the first and last year and every fifth year in between
+def year_marks(first, last):
+    return {str(i): '{}'.format(str(i)) for i in
+            sorted({int(first), int(last)} | set(range(int(first) // 5 * 5 + 5, int(last), 5)))}
+
+
 # Slider for the year choice
 range_slider = dcc.RangeSlider(
     id = 'range_slider',
     min = df['Execution Year'].min(),
     max = df['Execution Year'].max(),
-    marks = {str(i): '{}'.format(str(i)) for i in
-           [1977, 1980, 1985, 1990, 1995, 2000, 2005, 2010, 2015, 2020, 2023]},
+    marks = year_marks(df['Execution Year'].min(), df['Execution Year'].max()),
     value = [df['Execution Year'].min(), df['Execution Year'].max()],
     tooltip={"placement": "bottom", "always_visible": True},
     step = 1
@@ -45,7 +68,7 @@ range_slider = dcc.RangeSlider(
 # Dropdown for sex
 sex_dropdown = dcc.Dropdown(
     id = 'sex_dropdown',
-    options = df['Sex'].unique(),
+    options = df['Sex'].unique().tolist(),
     multi = False,
     clearable = True,
     searchable= False,
@@ -56,7 +79,7 @@ sex_dropdown = dcc.Dropdown(
 # Dropdown for race
 race_dropdown = dcc.Dropdown(
     id = 'race_dropdown',
-    options = df['Race'].unique(),
+    options = df['Race'].unique().tolist(),
     multi = False,
     clearable = True,
     searchable= False,
@@ -78,7 +101,27 @@ foreign_checkbox  = dcc.Checklist(
     value=[]
 )
 
-counts = df.groupby(['Execution Date', 'Race']).size().reset_index(name='Count')
+# Aggregate cube every chart is computed from, so the callback never scans the raw rows
+cube = load_cube(df)
+
+# The dataset and its cube as one value, for readers that need both from the same version
+# while a reload may swap them (see `refresh`)
+snapshot = (df, cube)
+
+# Bitmap index over the rows, with the frame it indexes, for the row export of the API (see
+# `filtered_rows`). No chart needs the rows, so it is only built on first use
+engine = None
+
+# Rendered figures, shared between workers when FIGURE_CACHE_PATH is set
+figure_cache = FigureCache(
+    maxsize=config.FIGURE_CACHE_SIZE,
+    backend=SQLiteBackend(config.FIGURE_CACHE_PATH, config.FIGURE_CACHE_SHARED_SIZE) if config.FIGURE_CACHE_PATH else None,
+    version=df.attrs.get('version', '')
+)
+
+for stat in ['hits', 'shared_hits', 'misses', 'evictions']:
+    metrics.counter(f'figure_cache_{stat}_total', f'Figure cache {stat.replace("_", " ")}',
+                    lambda stat=stat: figure_cache.stats()[stat])
 
 
 ################################### APP ###################################
@@ -87,6 +130,79 @@ app = dash.Dash(__name__ )
 
 server = app.server
 
+# Stage timings and response sizes of the chart callbacks, served at /metrics
+metrics.init_app(server)
+
+# Compressed responses (registered after the metrics, so /metrics counts the compressed size)
+# and immutable caching of the fingerprinted assets
+compression.init_app(server)
+static_files.init_app(app)
+
+#################### CONCURRENT REQUESTS ####################
+# Under a threaded worker (see gunicorn.conf.py) the charts of a filter change are built
+# concurrently, each in its own request. Building is limited to BUILD_CONCURRENCY requests
+# per worker, so figures served from the caches never queue behind slow builds.
+#
+# Each browser tab tags its requests with a random client id and an increasing sequence
+# number. A request still waiting for a build slot when a newer one for the same chart has
+# arrived from the same tab (the user kept dragging the slider) is dropped unbuilt: its
+# answer would be replaced anyway. Requests are only compared within a worker.
+
+app.renderer = '''
+var client = Math.random().toString(36).slice(2);
+var sequence = 0;
+var renderer = new DashRenderer({
+    request_pre: function (payload) {
+        payload.client = client;
+        payload.sequence = ++sequence;
+    }
+});
+'''
+
+# Latest sequence number seen per (client, output), oldest clients forgotten first
+latest_requests = collections.OrderedDict()
+latest_lock = threading.Lock()
+stale_requests = 0
+
+build_slots = threading.BoundedSemaphore(config.BUILD_CONCURRENCY)
+
+metrics.counter('stale_requests_total', 'Chart requests dropped because a newer one came from the same tab',
+                lambda: stale_requests)
+
+
+def request_sequence():
+    body = flask.request.get_json(silent=True) or {}
+    client, sequence = body.get('client'), body.get('sequence')
+    if not isinstance(client, str) or not isinstance(sequence, int):
+        return None, None
+    return (client, body.get('output')), sequence
+
+
+@server.before_request
+def track_request():
+    if not flask.request.path.endswith('/_dash-update-component'):
+        return
+    key, sequence = request_sequence()
+    if key is None:
+        return
+    with latest_lock:
+        if sequence > latest_requests.get(key, -1):
+            latest_requests[key] = sequence
+        latest_requests.move_to_end(key)
+        while len(latest_requests) > 10000:
+            latest_requests.popitem(last=False)
+
+
+# Whether a newer request for the same chart came from the same tab as the current one
+def superseded():
+    if not flask.has_request_context():
+        return False
+    key, sequence = request_sequence()
+    if key is None:
+        return False
+    with latest_lock:
+        return latest_requests.get(key, -1) > sequence
+
 #################### APP LAYOUT ####################
 
 app.layout = html.Div(style={'backgroundColor': colors['background']},
@@ -134,35 +250,53 @@ app.layout = html.Div(style={'backgroundColor': colors['background']},
     html.Br(),
     html.Div([
         html.Div([
-            html.Label(id='map_title'),
+            html.Label('Total number of executions by state', id='map_title'),
         ], style={'text-align': 'center', 'padding-bottom': '10px', 'font-weight': 'bold', 'font-size': '20px', 'width': '350px', 'margin-left': '500px'}),
             html.Div([
                 race_dropdown
             ], style={'text-align': 'center', 'width': '350px', 'margin-left': '500px', 'color': '#1E1E1E', 'background-color': '#1E1E1E'}),
         html.Div([
-            dcc.Graph(id='choropleth_map'),
+            dcc.Graph(id='choropleth_map', figure=figures.skeletons['choropleth_map']),
         ], style={'width': '100%'}),
     ], style={'display': 'inline-block', 'width': '100%', 'text-align': 'center'}),
+    html.Div([
+        html.Div([
+            html.Label(id='state_detail_title', style={'font-weight': 'bold', 'font-size': '20px'}),
+            html.Button('Close', id='state_detail_close', n_clicks=0, style={'margin-left': '20px'}),
+        ], style={'text-align': 'center', 'padding-bottom': '10px'}),
+        html.Div([
+            html.Div([
+                dcc.Graph(id='state_linechart', figure=figures.skeletons['linechart'])
+            ], style={'width': '40%'}),
+            html.Div([
+                dcc.Graph(id='state_nested_pie_chart', figure=figures.skeletons['nested_pie_chart'])
+            ], style={'width': '25%'}),
+            html.Div([
+                dcc.Graph(id='state_matrix', figure=figures.skeletons['matrix'])
+            ], style={'width': '35%'}),
+        ], style={'display': 'flex', 'align-items': 'center', 'justify-content': 'center', 'width': '100%'}),
+        dcc.Store(id='state_detail_request'),
+    ], id='state_detail', style={'display': 'none'}),
     html.Div([
         html.Div([        html.H2(['Between 1977 and 2023, ',html.Strong('1561'),' prisioners were executed in the USA.'])    ], style={'width': '30%', 'text-align': 'center', 'font-family':'Montserrat-VariableFont_wght', 'fontstyle': 'light'}),
         html.Div([
-            dcc.Graph(id='nested_pie_chart')    ], style={'width': '30%'}),
+            dcc.Graph(id='nested_pie_chart', figure=figures.skeletons['nested_pie_chart'])    ], style={'width': '30%'}),
         html.Div([        html.H2([ html.Strong('55.6%'),'of the executed were white and ',html.Strong('98.5%') ,'of them were male.'])    ], style={'width': '30%', 'text-align': 'center', 'font-family':'Montserrat-VariableFont_wght', 'fontstyle': 'light'}),
     ], style={'display': 'flex', 'align-items': 'center', 'justify-content': 'center', 'width': '100%'}),
     html.Div([
         html.Div([
-            dcc.Graph(id='linechart')
+            dcc.Graph(id='linechart', figure=figures.skeletons['linechart'])
         ], style={'display': 'inline-block', 'width': '48%'}),
         html.Div([
-            dcc.Graph(id='stackedBar')
+            dcc.Graph(id='stackedBar', figure=figures.skeletons['stacked_bar'])
         ], style={'display': 'inline-block', 'width': '48%'}),
     ], style={'display': 'inline-block', 'width': '100%', 'text-align': 'center'}),
     html.Div([
         html.Div([
-            dcc.Graph(id='matrix'),
+            dcc.Graph(id='matrix', figure=figures.skeletons['matrix']),
         ], style={'display': 'inline-block', 'width': '48%', 'text-align': 'center'}),
          html.Div([
-            dcc.Graph(id='scatter_fig')
+            dcc.Graph(id='scatter_fig', figure=figures.skeletons['scatter_fig'])
         ], style={'display': 'inline-block', 'width': '48%'}),
     ], style={'display': 'inline-block', 'width': '100%', 'text-align': 'center'}),
     html.Br(),
@@ -171,7 +305,7 @@ app.layout = html.Div(style={'backgroundColor': colors['background']},
         html.Footer(
              children=[
                 html.Img(
-                    src='/assets/logo.png',
+                    src=static_files.asset_url(app, 'logo.png'),
                     style={
                         'height': '70px',
                         'margin-right': '60px',
@@ -189,223 +323,352 @@ app.layout = html.Div(style={'backgroundColor': colors['background']},
 sex_dropdown.style = {'margin-top': '20px', 'margin-left': '-15px'}
 
 ################################### CALLBACKS ###################################
+# One callback per figure, each subscribed only to the inputs it uses: changing the race
+# only rebuilds the map. The filtered sub-cube is shared between the callbacks through
+# `filtered_subset`, so it is computed once per filter state. The callbacks are registered
+# at the end of this section, either as these server callbacks or as their clientside
+# versions in assets/clientside.js.
+
+filter_inputs = [
+    Input('range_slider', 'value'),
+    Input('sex_dropdown', 'value'),
+    Input('volunteer_checkbox', 'value'),
+    Input('foreign_checkbox', 'value')
+]
+
+
+# Server-side store of the filtered sub-cubes, keyed by the normalized filter state. Its copies
+# are private to the worker, so it is bounded by their size (SUBSET_CACHE_MB)
+subcube_cache = SubcubeCache(config.SUBSET_CACHE_MB << 20)
+
+
+def filtered_subset(years, sex, volunteer, foreign, source=None):
+    # The current cube or `source`, one taken with its dataset (see `snapshot`). A reload may
+    # swap the cube during the build; the key names the data it is built from
+    current = cube if source is None else source
+
+    def build():
+        filtered_cube = current.select(years, {
+            'Sex': sex,
+            'Execution Volunteer': 'yes' if volunteer else None,
+            'Foreign National': 'Yes' if foreign else None,
+        })
+        # Contiguous copy so the per-figure sums don't walk a strided view of the full cube
+        filtered_cube.values = np.ascontiguousarray(filtered_cube.values)
+        return filtered_cube
+
+    return subcube_cache.get((current.version, years, sex, volunteer, foreign), build)
+
+
+# Normalized filter state: equivalent input values (None/'' or ['yes']/['yes', 'yes']) give the same key
+def filter_key(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox, race_dropdown=None):
+    return (tuple(int(year) for year in range_slider), sex_dropdown or None, race_dropdown or None,
+            'yes' in (volunteer_checkbox or []), 'Yes' in (foreign_checkbox or []))
+
+
+def subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox):
+    years, sex, _, volunteer, foreign = filter_key(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox)
+    with metrics.stage('filter'):
+        return filtered_subset(years, sex, volunteer, foreign)
+
+
+# Engine of `rows`, rebuilt when the dataset has been reloaded since the last one was built
+def filter_engine(rows):
+    global engine
+    current = engine
+    if current is None or current[0] is not rows:
+        current = engine = (rows, FilterEngine(rows))
+    return current[1]
 
-@app.callback(
-    [
-        Output('map_title', 'children'),
-        Output('choropleth_map', 'figure'),
-        Output('nested_pie_chart', 'figure'),
-        Output('linechart', 'figure'),
-        Output('matrix', 'figure'),
-        Output('scatter_fig', 'figure'),
-        Output('stackedBar', 'figure')
-    ],
-    [
-        Input('range_slider', 'value'),
-        Input('sex_dropdown', 'value'),
-        Input('race_dropdown', 'value'),
-        Input('volunteer_checkbox', 'value'),
-        Input('foreign_checkbox', 'value')
-    ]
-)
 
-def plot(range_slider, sex_dropdown, race_dropdown, volunteer_checkbox, foreign_checkbox):
-    filtered_df = df[(df['Execution Year'] >= range_slider[0]) & (df['Execution Year'] <= range_slider[1])]
-
-    if sex_dropdown:
-        filtered_df = filtered_df[filtered_df['Sex']==sex_dropdown]
-
-    if 'yes' in volunteer_checkbox:
-        filtered_df = filtered_df[filtered_df['Execution Volunteer'] == 'yes']
-
-    if 'Yes' in foreign_checkbox:
-        filtered_df = filtered_df[filtered_df['Foreign National'] == 'Yes']
-
-    ### VISUALIZATION 1- USA MAP
-    if race_dropdown:
-        filtered_df_map = filtered_df[filtered_df['Race']==race_dropdown]
-        executions_by_state = filtered_df_map.groupby('State Code')['State Code'].count().reset_index(name='Executions')
-        executions_by_state['State'] = filtered_df_map['State']
-    else:
-        executions_by_state = filtered_df.groupby('State Code')['State Code'].count().reset_index(name='Executions')
-        executions_by_state['State'] = filtered_df['State']
-
-    map_title = f'Total number of executions by state'
-
-    choropleth_map = px.choropleth(data_frame=executions_by_state,
-                        locations='State Code',
-                        locationmode="USA-states",
-                        scope="usa",
-                        height=600,
-                        color='Executions',
-                        color_continuous_scale= px.colors.diverging.Geyser,
-                        range_color=(0, executions_by_state['Executions'].max()),
-                        labels={'Executions': 'Number of Executions'},
-                        hover_data={'State':True, 'Executions':True}
-                         )
-
-    choropleth_map.update_layout(
-        coloraxis_colorbar=dict(
-            title=dict(
-                text='<b>Number of<br>Executions</b>',
-                font=dict(color='white')
-            ),
-            tickfont=dict(color='white'),
-        ),
-        paper_bgcolor='rgb(30,30,30)',
-        plot_bgcolor='rgb(30,30,30)',
-        geo=dict(bgcolor='rgb(30,30,30)'),
-        font=dict(color='black'),
-        title=dict(font=dict(color='white'))
-    )
-
-    ### VISUALIZATION 2- NESTED PIE CHART
-
-    filtered_df_grouped = filtered_df.groupby(['Sex', 'Race']).size().reset_index(name='Executions')
-    geyser_colors = px.colors.diverging.Geyser
-    temps_colors = px.colors.diverging.Temps
-    colors1 = [geyser_colors[0], geyser_colors[2], geyser_colors[4], geyser_colors[6], geyser_colors[1], geyser_colors[5], temps_colors[1], temps_colors[3], temps_colors[5]]
-    colors2 = [geyser_colors[0], geyser_colors[1]]
-    nested_pie_chart = px.sunburst(data_frame=filtered_df_grouped,
-                               path=['Sex', 'Race'],
-                               values='Executions',
-                               color='Race',
-                               color_discrete_sequence=colors1,
-                               branchvalues='total',
-                               title='Number of executions by sex and race'
-                               )
-    nested_pie_chart.update_traces(marker=dict(colors=colors1))
-    nested_pie_chart.update_layout(
-    title=dict(text="<b>Total no. of executions by sex and race</b>", font=dict(color='white', size=18), x=0.5, y=0.95),
-    paper_bgcolor='rgba(0,0,0,0)',
-    plot_bgcolor='rgba(0,0,0,0)'
-)
+# Rows of the dataset (or of `rows`, a version of it) matching a normalized filter state (see
+# `filter_key`), selected through the bitmap engine
+def filtered_rows(years, sex, race, volunteer, foreign, rows=None):
+    rows = df if rows is None else rows
+    return rows.iloc[filter_engine(rows).select(years, {
+        'Sex': sex,
+        'Race': race,
+        'Execution Volunteer': 'yes' if volunteer else None,
+        'Foreign National': 'Yes' if foreign else None,
+    })]
+
+
+# Serve a figure callback from `figure_cache`, keyed by its name and the normalized filter state
+def memoized(callback):
+    @functools.wraps(callback)
+    def wrapper(*args):
+        key = (callback.__name__,) + filter_key(*args)
+        with metrics.stage('cache'):
+            return figure_cache.get(key, lambda: build(callback, args))
+    return wrapper
 
-    ### VISUALIZATION 3 - LINE CHART
-
-    executions_by_race_by_year = filtered_df.groupby(['Race', 'Execution Year']).size().reset_index(name='Executions')
-
-    linechart = px.line(executions_by_race_by_year, title="Executions per race over time", x="Execution Year", y='Executions', color='Race', height=400)
-
-    linechart.update_layout(
-        title=dict(text="<b>Executions per race over time</b>", font=dict(color='white'), x=0.5, y=0.95),
-        xaxis=dict(title=dict(text='<b>Execution Year</b>', font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        yaxis=dict(title=dict(text='<b>Executions</b>', font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        legend=dict(title=dict(text='<b>Race</b>', font=dict(color='white')),
-                    font=dict(color='white')),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)'
-    )
-
-    ### VISUALIZATION 4 - MATRIX (HEATMAP)
-
-    victims_by_race = filtered_df.groupby('Race').size().reset_index(name='Executions')
-    victims_by_race = victims_by_race[victims_by_race['Executions'] > 0]    # filter out races with 0 executions
-
-    victims_columns = ['Number of White Victims', 'Number of Black Victims', 'Number of Latino Victims',
-                       'Number of Asian Victims', 'Number of Native American Victims', 'Number of Other Race Victims']
-
-    race_victims = ['White', 'Black', 'Latinx', 'Asian', 'Native American', 'Other Race']
-
-    victims_data = filtered_df.groupby('Race')[victims_columns].sum().reset_index(drop=True)
-
-    matrix = px.imshow(victims_data,
-                     labels=dict(x="Victim's Race", y="Race of the Executed", title="Executioners' race vs. victims' race"),
-                     x=race_victims,
-                     y=victims_by_race['Race'],
-                       text_auto=True,
-                     color_continuous_scale= px.colors.diverging.Geyser)
-
-    matrix.update_layout(
-        xaxis=dict(title=dict(text="<b>Victim's Race</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        yaxis=dict(title=dict(text='<b>Race of the Executed</b>', font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        coloraxis=dict(colorbar=dict(title=dict(text='<b>Number of Executions</b>', font=dict(color='white')),
-                                     tickfont=dict(color='white'))),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        title=dict(text="<b>Executioners' race vs victims' race</b>", font=dict(color='white'), x=0.5, y=0.95)
-    )
-
-    ### VISUALIZATION 5 - SCATTER PLOT
-
-    executions_by_year = filtered_df.groupby(['Execution Year', 'Region']).agg({'Region': 'count'}).rename(
-        columns={'Region': 'No_executions'}).reset_index()
-    scatter_fig = px.scatter(executions_by_year, x="Execution Year", y="Region", size='No_executions', title="Execution Year vs Region", color_discrete_sequence=['#028180'])
-
-    # Set the axis and hover labels
-    scatter_fig.update_layout(
-        xaxis_title="Execution Year",
-        yaxis_title="Region",
-        hovermode="closest",
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        xaxis=dict(title=dict(text="<b>Execution Year</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        yaxis=dict(title=dict(text="<b>Region</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        title=dict(text="<b>Execution year vs region</b>", font=dict(color='white'),x=0.5, y=0.95)
-    )
-
-    filtered_df['ID'] = filtered_df.index
-    pivot_df = pd.pivot_table(filtered_df, values='ID', index=['Race'], columns=['Region'], aggfunc='count',
-                              dropna=False).sort_values("South", ascending=False)
-    #  pivot_df = pd.pivot_table(filtered_df, values='ID', index=['Race'], columns=['Region'], aggfunc='count').sort_values("South", ascending=False)
-    geyser_colors = px.colors.diverging.Geyser
-    stackedBar = px.bar(pivot_df, x=pivot_df.index, title='Total no. of executions by race and region')
-    for i, col in enumerate(pivot_df.columns):
-        stackedBar.add_trace(
-            go.Bar(x=pivot_df.index, y=pivot_df[col], name=col, marker=dict(color=geyser_colors[i]))
-        )
-    stackedBar.update_layout(
-        barmode='stack',
-        yaxis=dict(title='Number of Executions'),
-        xaxis=dict(title='Race')
-    )
-    stackedBar.update_layout(
-        title=dict(text="<b>Total no. of executions by race and region</b>", font=dict(color='white'), x=0.5, y=0.95),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        xaxis=dict(title=dict(text="<b>Race</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        yaxis=dict(title=dict(text="<b>Number of Executed in log scale</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')
-                    ,type='log'
-                   ),
-        legend=dict(
-            title=dict(text="<b>Region</b>", font=dict(color='white')),
-            font=dict(color='white')
-        )
-    )
-    return map_title, choropleth_map, nested_pie_chart, linechart, matrix, scatter_fig, stackedBar
-    for col in pivot_df.columns:
-        stackedBar.add_trace(
-            go.Bar(x=pivot_df.index, y=pivot_df[col], name=col)
+
+def build(callback, args):
+    global stale_requests
+    with metrics.stage('queue'):
+        build_slots.acquire()
+    try:
+        if superseded():
+            with latest_lock:
+                stale_requests += 1
+            raise PreventUpdate
+        with metrics.stage('build'):
+            return callback(*args)
+    finally:
+        build_slots.release()
+
+
+# Send a figure update from figures.py as a partial property update: the layout skeleton is
+# already in the page, so only the traces and the layout values that depend on them travel
+def as_patch(callback):
+    @functools.wraps(callback)
+    def wrapper(*args):
+        return to_patch(callback(*args))
+    return wrapper
+
+
+def to_patch(update):
+    with metrics.stage('patch'):
+        patch = Patch()
+        patch['data'] = update['data']
+        set_values(patch['layout'], update.get('layout', {}))
+        return patch
+
+
+def set_values(target, values):
+    for key, value in values.items():
+        if isinstance(value, dict):
+            set_values(target[key], value)
+        else:
+            target[key] = value
+
+
+@as_patch
+@memoized
+def update_choropleth_map(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox, race_dropdown):
+    return figures.choropleth_map(subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox), race_dropdown)
+
+
+@as_patch
+@memoized
+def update_nested_pie_chart(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox):
+    return figures.nested_pie_chart(subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox))
+
+
+@as_patch
+@memoized
+def update_linechart(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox):
+    return figures.linechart(subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox))
+
+
+@as_patch
+@memoized
+def update_matrix(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox):
+    return figures.matrix(subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox))
+
+
+@as_patch
+@memoized
+def update_scatter_fig(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox):
+    return figures.scatter_fig(subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox))
+
+
+@as_patch
+@memoized
+def update_stacked_bar(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox):
+    return figures.stacked_bar(subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox))
+
+
+# Graph id, callback and inputs of every figure
+figure_callbacks = [
+    ('choropleth_map', update_choropleth_map, filter_inputs + [Input('race_dropdown', 'value')]),
+    ('nested_pie_chart', update_nested_pie_chart, filter_inputs),
+    ('linechart', update_linechart, filter_inputs),
+    ('matrix', update_matrix, filter_inputs),
+    ('scatter_fig', update_scatter_fig, filter_inputs),
+    ('stackedBar', update_stacked_bar, filter_inputs),
+]
+
+
+# Build the default view once at boot so the first visitors are served from the cache
+def warm_up():
+    default = ([range_slider.min, range_slider.max], None, [], [])
+    update_choropleth_map(*default, None)
+    for callback in [update_nested_pie_chart, update_linechart, update_matrix, update_scatter_fig, update_stacked_bar]:
+        callback(*default)
+
+
+cube_cells = cube.cells() if config.CLIENTSIDE_FILTERING else None
+clientside = cube_cells is not None and len(cube_cells['cells']['Executions']) <= config.CLIENTSIDE_MAX_CELLS
+
+if clientside:
+    # The cube cells go to the browser once with the layout; each chart is then rebuilt there
+    # from the store and its skeleton, by the function named after the callback
+    cube_store = dcc.Store(id='cube_store', data=cube_cells)
+    app.layout.children.append(cube_store)
+    for graph_id, callback, inputs in figure_callbacks:
+        app.clientside_callback(
+            ClientsideFunction('executions', callback.__name__[len('update_'):]),
+            Output(graph_id, 'figure'),
+            [Input('cube_store', 'data')] + inputs,
+            State(graph_id, 'figure')
         )
-    stackedBar.update_layout(
-        barmode='stack',
-        yaxis=dict(title='Number of Executions'),
-        xaxis=dict(title='Race')
-    )
-    stackedBar.update_layout(
-        title=dict(text="<b>Number of Executed by Race and Region</b>", font=dict(color='white'), x=0.5, y=0.95),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        xaxis=dict(title=dict(text="<b>Race</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')),
-        yaxis=dict(title=dict(text="<b>Number of Executed in log scale</b>", font=dict(color='white')),
-                   tickfont=dict(color='white')
-                    ,type='linear'
-                   ),
-        legend=dict(
-            title=dict(text="<b>Region</b>", font=dict(color='white')),
-            font=dict(color='white')
-        )
-    )
-    return map_title, choropleth_map, nested_pie_chart, linechart, matrix, scatter_fig, stackedBar
+else:
+    for graph_id, callback, inputs in figure_callbacks:
+        app.callback(Output(graph_id, 'figure'), inputs)(callback)
+
+    # Preloaded, the warm-up runs once in the gunicorn master for every worker. A worker that
+    # imports the app itself (PRELOAD_APP=0) boots without it and builds on the first request
+    if config.FIGURE_CACHE_WARMUP and config.PRELOAD_APP:
+        warm_up()
+
+
+#################### STATE DRILL-DOWN ####################
+# Clicking a state on the map opens its detail under the map: its executions per race over
+# time, the sex and race split and the victims matrix, under the current filters. The cube is
+# indexed by state code, so a state's detail is its slice of the filtered sub-cube fed to the
+# dashboard's own chart builders. Nothing is built before a state is clicked, and each (state,
+# filter state) is built once and then served from the figure cache. The chart callbacks
+# above don't depend on the click and are not affected.
+#
+# The filters reach the server callback through the 'state_detail_request' store, set in the
+# browser by `executions.state_detail_request` (assets/clientside.js). It only changes when a
+# state is clicked or closed, or when the filters change while a state is open, so filter
+# changes with the panel closed make no request, also with CLIENTSIDE_FILTERING.
+
+def state_detail(state_code, range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox, race_dropdown):
+    # Like the map the state was clicked on, the detail is restricted to the chosen race
+    state_cube = subset(range_slider, sex_dropdown, volunteer_checkbox, foreign_checkbox).select(
+        filters={'State Code': state_code, 'Race': race_dropdown})
+    executions = int(state_cube.values[..., 0].sum())
+    return {
+        'title': f'{cube.state_names[state_code]}: {executions} executions' + (f' ({race_dropdown})' if race_dropdown else ''),
+        'linechart': figures.linechart(state_cube),
+        'nested_pie_chart': figures.nested_pie_chart(state_cube),
+        'matrix': figures.matrix(state_cube),
+    }
+
+
+app.clientside_callback(
+    ClientsideFunction('executions', 'state_detail_request'),
+    Output('state_detail_request', 'data'),
+    Input('choropleth_map', 'clickData'),
+    *filter_inputs,
+    Input('race_dropdown', 'value'),
+    prevent_initial_call=True
+)
+
+
+@app.callback(
+    Output('state_detail', 'style'),
+    Output('state_detail_title', 'children'),
+    Output('state_linechart', 'figure'),
+    Output('state_nested_pie_chart', 'figure'),
+    Output('state_matrix', 'figure'),
+    Input('state_detail_request', 'data'),
+    prevent_initial_call=True
+)
+def update_state_detail(request):
+    state_code, filters = (request or {}).get('state'), (request or {}).get('filters')
+    if state_code not in cube.state_names:
+        return {'display': 'none'}, '', dash.no_update, dash.no_update, dash.no_update
+    args = (state_code, *filters)
+    key = ('state_detail', state_code) + filter_key(*filters)
+    with metrics.stage('cache'):
+        detail = figure_cache.get(key, lambda: build(state_detail, args))
+    return ({'display': 'block'}, detail['title'], to_patch(detail['linechart']),
+            to_patch(detail['nested_pie_chart']), to_patch(detail['matrix']))
+
+
+@app.callback(Output('choropleth_map', 'clickData'), Input('state_detail_close', 'n_clicks'), prevent_initial_call=True)
+def close_state_detail(n_clicks):
+    return None
+
+
+#################### DATA UPDATES ####################
+# Rows appended with append.py are picked up by running workers: before a request, at most
+# once per DATASET_RELOAD_INTERVAL seconds, the worker checks whether the dataset store has a
+# new version. If so it maps the new rows and the cube the appender saved, drops its cached
+# sub-cubes and figures, and updates the filter components. The layout is serialized on
+# every page load, so new visitors get the new years and options.
+
+reload_lock = threading.Lock()
+last_reload_check = 0.0
+
+
+def update_components():
+    first, last = df['Execution Year'].min(), df['Execution Year'].max()
+    range_slider.min, range_slider.max, range_slider.value = first, last, [first, last]
+    range_slider.marks = year_marks(first, last)
+    sex_dropdown.options = df['Sex'].unique().tolist()
+    race_dropdown.options = df['Race'].unique().tolist()
+    if clientside:
+        cube_store.data = cube.cells()
+
+
+@server.before_request
+def refresh():
+    global df, cube, snapshot, engine, last_reload_check
+    if not config.DATASET_RELOAD_INTERVAL or time.monotonic() - last_reload_check < config.DATASET_RELOAD_INTERVAL:
+        return
+    # One thread checks while the others carry on with the current data
+    if not reload_lock.acquire(blocking=False):
+        return
+    try:
+        last_reload_check = time.monotonic()
+        with metrics.stage('reload'):
+            updated = dataset.reload(df)
+            if updated is None:
+                return
+            df, cube, engine = updated, load_cube(updated), None
+            snapshot = (df, cube)
+            subcube_cache.clear()
+            figure_cache.reset(df.attrs.get('version', ''))
+            update_components()
+    finally:
+        reload_lock.release()
+
+
+#################### PRECOMPUTED RESPONSES ####################
+# When precompute.py has rendered the responses of the current dataset, a chart request is
+# answered before it reaches Dash: its filter state is normalized into a store key and the
+# stored bytes are sent as they are (gzipped, unless the client doesn't accept it). States
+# the job hasn't rendered yet go through the callbacks above.
+
+responses = ResponseStore()
+callback_inputs = {graph_id: [input.component_id for input in inputs] for graph_id, _, inputs in figure_callbacks}
+
+
+@server.before_request
+def serve_precomputed():
+    if clientside or not config.PRECOMPUTED_RESPONSES or not flask.request.path.endswith('/_dash-update-component'):
+        return None
+    body = flask.request.get_json(silent=True) or {}
+    graph_id = body.get('outputs', {}).get('id') if isinstance(body.get('outputs'), dict) else None
+    if graph_id not in callback_inputs:
+        return None
+    with metrics.stage('lookup'):
+        values = {input.get('id'): input.get('value') for input in body.get('inputs', [])}
+        try:
+            key = state_key(graph_id, filter_key(*[values[name] for name in callback_inputs[graph_id]]))
+        except (KeyError, TypeError, ValueError):
+            return None
+        response = responses.get(df.attrs.get('version'), key)
+        if response is None:
+            return None
+        if flask.request.accept_encodings['gzip']:
+            response = flask.Response(response, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = flask.Response(gzip.decompress(response), mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        return response
+
+#################### AGGREGATES API ####################
+# The aggregates behind the charts as JSON or CSV under /api/aggregates (see api.py), computed
+# from the same filtered sub-cubes as the callbacks
+
+api.init_app(server, lambda: snapshot, filtered_subset, filtered_rows)
 
 ################################### END OF THE APP ###################################
 
@@ -0,0 +1,118 @@
+# Append new execution records to the dataset without reloading or regrouping it.
+#
+#   python append.py new_executions.csv [--source CSV] [--cache-dir DIR]
+#
+# The new file has the columns of the raw CSV. Only its rows go through the cleaning
+# pipeline. They are appended to the cached column store, and the aggregate cube is updated
+# by adding the cube of the new rows to it. A local source CSV also gets the raw rows, so it
+# stays the full record of the data. It is written last, once the store has the rows and can
+# be found under the version of the grown source, so a worker booting at any point of an
+# append finds the one store. Appends to the same cache directory run one at a time.
+#
+# Running workers notice the store's new version within DATASET_RELOAD_INTERVAL seconds and
+# switch to the new data (see `refresh` in app.py). No restart is needed.
+
+# Import packages
+import argparse
+import fcntl
+import hashlib
+import os
+import shutil
+
+import pandas as pd
+
+import config
+import dataset
+from cube import Cube, cube_path, load_cube
+from store import ColumnStore
+
+
+def is_local(source):
+    return not source.startswith(('http://', 'https://'))
+
+
+# Bytes that add the raw rows of `filename` (header line excluded) at the end of the CSV at `source`
+def raw_rows(filename, source):
+    with open(source, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        last = b'\n'
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+    with open(filename, 'rb') as new:
+        new.readline()
+        # The bundled CSV doesn't end with a newline
+        return (b'' if last == b'\n' else b'\n') + new.read()
+
+
+def grow_source(source, raw):
+    with open(source, 'ab') as f:
+        f.write(raw)
+
+
+# Append the rows of the raw CSV `filename` to the dataset and return the new version
+def append(filename, source=None, cache_dir=None, chunk_size=None):
+    source = config.DATASET_SOURCE if source is None else source
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        raise ValueError('Appending needs the dataset cache (DATASET_CACHE_DIR is empty)')
+
+    rows = pd.concat(dataset.read_chunks(filename, chunk_size), ignore_index=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    # One append at a time per cache directory, each loading the dataset the previous one left
+    with open(os.path.join(cache_dir, 'append.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        df = dataset.load(source, cache_dir)
+        if not len(rows):
+            return df.attrs['version']
+        return append_rows(filename, rows, df, source, cache_dir)
+
+
+def append_rows(filename, rows, df, source, cache_dir):
+    path = df.attrs['store']
+    cube = load_cube(df, cache_dir)
+    if is_local(source):
+        # The grown source is what later boots hash, so the new version is its hash. The
+        # source is only written once the store and its alias are in place, below
+        raw = raw_rows(filename, source)
+        version = dataset.dataset_version(source, raw)
+    else:
+        # A remote source can't be written to: chain the version on the appended rows
+        with open(filename, 'rb') as f:
+            version = f'v{dataset.CACHE_VERSION}-{hashlib.sha256(df.attrs["version"].encode() + f.read()).hexdigest()[:16]}'
+
+    # The cube goes first, so a worker that sees the new rows also finds their cube
+    cube.add(Cube.from_frame(rows)).save(cube_path(version, cache_dir))
+    ColumnStore(path).append(rows, {'version': version})
+
+    # Workers still on the old version keep their mapping of the old cube until they refresh
+    shutil.rmtree(cube_path(df.attrs['version'], cache_dir), ignore_errors=True)
+
+    if is_local(source):
+        # Later boots look the store up by the new hash of the source. The alias exists before
+        # the source grows, so no boot can ingest a separate store under that name; a boot
+        # before the source grows finds this store under the old name, with the new rows
+        alias = dataset.cache_path(version, cache_dir)
+        if not os.path.exists(alias):
+            os.symlink(os.path.basename(path), alias)
+        grow_source(source, raw)
+        dataset.record_version(source, dataset.source_metadata(source), version, cache_dir)
+        # The alias of the previous append no longer matches the source. Workers hold the real
+        # path of the store (see `dataset.load`), so none of them depends on it
+        previous = dataset.cache_path(df.attrs['version'], cache_dir)
+        if os.path.islink(previous):
+            os.remove(previous)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append new execution records to the dataset')
+    parser.add_argument('filename', help='CSV of new records, with the columns of the raw dataset')
+    parser.add_argument('--source', help='dataset to append to, DATASET_SOURCE by default')
+    parser.add_argument('--cache-dir', help='dataset cache directory, DATASET_CACHE_DIR by default')
+    args = parser.parse_args()
+    print(append(args.filename, args.source, args.cache_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+// Clientside counterparts of the chart builders in figures.py, used when CLIENTSIDE_FILTERING
+// is on. The non-empty cells of the aggregate cube (Cube.cells) are sent once in the
+// 'cube_store' dcc.Store; each callback filters and sums those cells in the browser and
+// returns the skeleton figure with new traces, so slider and checkbox changes never reach
+// the server. Every builder must produce the same traces as its Python version.
+
+(function () {
+    var raceVictims = ['White', 'Black', 'Latinx', 'Asian', 'Native American', 'Other Race'];
+
+    // Positions of the cells matching the filter state, like Cube.select
+    function select(store, range, sex, volunteer, foreign, race) {
+        var cells = store.cells, labels = store.labels;
+        var filters = [
+            ['Sex', sex],
+            ['Execution Volunteer', (volunteer || []).indexOf('yes') >= 0 ? 'yes' : null],
+            ['Foreign National', (foreign || []).indexOf('Yes') >= 0 ? 'Yes' : null],
+            ['Race', race]
+        ].filter(function (filter) { return filter[1]; }).map(function (filter) {
+            return [cells[filter[0]], labels[filter[0]].indexOf(filter[1])];
+        });
+        var years = cells['Execution Year'], firstYear = labels['Execution Year'][0];
+        var selected = [];
+        for (var i = 0; i < years.length; i++) {
+            var year = firstYear + years[i];
+            if (year < range[0] || year > range[1]) {
+                continue;
+            }
+            var keep = true;
+            for (var f = 0; f < filters.length && keep; f++) {
+                keep = filters[f][0][i] === filters[f][1];
+            }
+            if (keep) {
+                selected.push(i);
+            }
+        }
+        return selected;
+    }
+
+    // Sum the selected cells by the `keep` dimensions, like Cube.frame: one row per non-empty
+    // group in label order, with its label positions, executions and victim sums
+    function frame(store, selected, keep) {
+        var cells = store.cells, groups = {};
+        selected.forEach(function (i) {
+            var key = keep.map(function (dim) { return cells[dim][i]; });
+            var id = key.join(',');
+            if (!(id in groups)) {
+                groups[id] = {key: key, values: store.measures.map(function () { return 0; })};
+            }
+            store.measures.forEach(function (measure, m) { groups[id].values[m] += cells[measure][i]; });
+        });
+        return Object.keys(groups).map(function (id) { return groups[id]; }).filter(function (group) {
+            return group.values[0] > 0;
+        }).sort(function (a, b) {
+            for (var d = 0; d < a.key.length; d++) {
+                if (a.key[d] !== b.key[d]) {
+                    return a.key[d] - b.key[d];
+                }
+            }
+            return 0;
+        });
+    }
+
+    function label(store, dim, position) {
+        return store.labels[dim][position];
+    }
+
+    function withData(figure, data, layout) {
+        var updated = Object.assign({}, figure, {data: data, layout: Object.assign({}, figure.layout)});
+        Object.keys(layout || {}).forEach(function (key) {
+            updated.layout[key] = Object.assign({}, updated.layout[key], layout[key]);
+        });
+        return updated;
+    }
+
+    function templateLayout(figure) {
+        return figure.layout.template.layout;
+    }
+
+    function geyserColors(figure) {
+        return templateLayout(figure).coloraxis.colorscale.map(function (stop) { return stop[1]; });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        executions: {
+            // Request of the state drill-down in app.py, in both filtering modes: the clicked
+            // state and the filters, or null once the panel is closed. Filter changes while no
+            // state is open leave it unchanged, so they don't reach the server
+            state_detail_request: function (clickData, range, sex, volunteer, foreign, race) {
+                var points = (clickData || {}).points || [];
+                var state = points.length ? points[0].location : null;
+                if (!state) {
+                    var clicked = dash_clientside.callback_context.triggered.some(function (input) {
+                        return input.prop_id === 'choropleth_map.clickData';
+                    });
+                    return clicked ? null : dash_clientside.no_update;
+                }
+                return {state: state, filters: [range, sex, volunteer, foreign, race]};
+            },
+
+            choropleth_map: function (store, range, sex, volunteer, foreign, race, figure) {
+                // Federal executions have no state code and are left out of the map
+                var rows = frame(store, select(store, range, sex, volunteer, foreign, race), ['State Code']).filter(function (row) {
+                    return label(store, 'State Code', row.key[0]) !== null;
+                });
+                var codes = rows.map(function (row) { return label(store, 'State Code', row.key[0]); });
+                var executions = rows.map(function (row) { return row.values[0]; });
+                var trace = {
+                    type: 'choropleth',
+                    geo: 'geo',
+                    coloraxis: 'coloraxis',
+                    locationmode: 'USA-states',
+                    locations: codes,
+                    z: executions,
+                    customdata: codes.map(function (code, i) { return [store.state_names[code], executions[i]]; }),
+                    hovertemplate: 'State Code=%{location}<br>State=%{customdata[0]}<br>Number of Executions=%{z}<extra></extra>',
+                    name: ''
+                };
+                var cmax = executions.length ? Math.max.apply(null, executions) : null;
+                return withData(figure, [trace], {coloraxis: {cmax: cmax}});
+            },
+
+            nested_pie_chart: function (store, range, sex, volunteer, foreign, figure) {
+                var rows = frame(store, select(store, range, sex, volunteer, foreign), ['Sex', 'Race']);
+                var nodes = [], bySex = {};
+                rows.forEach(function (row) {
+                    var rowSex = label(store, 'Sex', row.key[0]), rowRace = label(store, 'Race', row.key[1]);
+                    nodes.push([rowSex + '/' + rowRace, rowRace, rowSex, row.values[0], rowRace]);
+                    bySex[rowSex] = bySex[rowSex] || {races: [], total: 0};
+                    bySex[rowSex].races.push(rowRace);
+                    bySex[rowSex].total += row.values[0];
+                });
+                Object.keys(bySex).sort().forEach(function (rowSex) {
+                    var group = bySex[rowSex];
+                    nodes.push([rowSex, rowSex, '', group.total, group.races.length === 1 ? group.races[0] : '(?)']);
+                });
+                // Stable sort by color, the order px.sunburst produces
+                nodes.sort(function (a, b) { return a[4] < b[4] ? -1 : a[4] > b[4] ? 1 : 0; });
+                var column = function (i) { return nodes.map(function (node) { return node[i]; }); };
+                var trace = {
+                    type: 'sunburst',
+                    ids: column(0),
+                    labels: column(1),
+                    parents: column(2),
+                    values: column(3),
+                    customdata: column(4).map(function (color) { return [color]; }),
+                    branchvalues: 'total',
+                    domain: {x: [0.0, 1.0], y: [0.0, 1.0]},
+                    marker: {colors: figure.layout.sunburstcolorway},
+                    hovertemplate: 'labels=%{label}<br>Executions=%{value}<br>parent=%{parent}<br>id=%{id}<br>Race=%{customdata[0]}<extra></extra>',
+                    name: ''
+                };
+                return withData(figure, [trace]);
+            },
+
+            linechart: function (store, range, sex, volunteer, foreign, figure) {
+                var rows = frame(store, select(store, range, sex, volunteer, foreign), ['Race', 'Execution Year']);
+                var colorway = templateLayout(figure).colorway, traces = [];
+                rows.forEach(function (row) {
+                    var race = label(store, 'Race', row.key[0]);
+                    var trace = traces.length && traces[traces.length - 1].name === race ? traces[traces.length - 1] : null;
+                    if (trace === null) {
+                        trace = {
+                            type: 'scatter',
+                            mode: 'lines',
+                            x: [],
+                            y: [],
+                            name: race,
+                            legendgroup: race,
+                            showlegend: true,
+                            line: {color: colorway[traces.length % colorway.length], dash: 'solid'},
+                            marker: {symbol: 'circle'},
+                            orientation: 'v',
+                            xaxis: 'x',
+                            yaxis: 'y',
+                            hovertemplate: 'Race=' + race + '<br>Execution Year=%{x}<br>Executions=%{y}<extra></extra>'
+                        };
+                        traces.push(trace);
+                    }
+                    trace.x.push(label(store, 'Execution Year', row.key[1]));
+                    trace.y.push(row.values[0]);
+                });
+                return withData(figure, traces);
+            },
+
+            matrix: function (store, range, sex, volunteer, foreign, figure) {
+                var rows = frame(store, select(store, range, sex, volunteer, foreign), ['Race']);
+                var trace = {
+                    type: 'heatmap',
+                    coloraxis: 'coloraxis',
+                    x: raceVictims,
+                    y: rows.map(function (row) { return label(store, 'Race', row.key[0]); }),
+                    z: rows.map(function (row) { return row.values.slice(1); }),
+                    texttemplate: '%{z}',
+                    xaxis: 'x',
+                    yaxis: 'y',
+                    hovertemplate: "Victim's Race: %{x}<br>Race of the Executed: %{y}<br>color: %{z}<extra></extra>",
+                    name: '0'
+                };
+                return withData(figure, [trace]);
+            },
+
+            scatter_fig: function (store, range, sex, volunteer, foreign, figure) {
+                var rows = frame(store, select(store, range, sex, volunteer, foreign), ['Execution Year', 'Region']);
+                var sizes = rows.map(function (row) { return row.values[0]; });
+                var trace = {
+                    type: 'scatter',
+                    mode: 'markers',
+                    x: rows.map(function (row) { return label(store, 'Execution Year', row.key[0]); }),
+                    y: rows.map(function (row) { return label(store, 'Region', row.key[1]); }),
+                    // Same bubble scaling as px.scatter with its default size_max of 20
+                    marker: {color: '#028180', size: sizes, sizemode: 'area', symbol: 'circle',
+                             sizeref: sizes.length ? Math.max.apply(null, sizes) / (20 * 20) : 1},
+                    name: '',
+                    legendgroup: '',
+                    showlegend: false,
+                    orientation: 'h',
+                    xaxis: 'x',
+                    yaxis: 'y',
+                    hovertemplate: 'Execution Year=%{x}<br>Region=%{y}<br>No_executions=%{marker.size}<extra></extra>'
+                };
+                return withData(figure, [trace]);
+            },
+
+            stacked_bar: function (store, range, sex, volunteer, foreign, figure) {
+                var rows = frame(store, select(store, range, sex, volunteer, foreign), ['Race', 'Region']);
+                var races = [], regions = [], counts = {};
+                rows.forEach(function (row) {
+                    var race = label(store, 'Race', row.key[0]), region = label(store, 'Region', row.key[1]);
+                    if (races.indexOf(race) < 0) { races.push(race); }
+                    if (regions.indexOf(region) < 0) { regions.push(region); }
+                    counts[race + '/' + region] = row.values[0];
+                });
+                regions.sort();
+                var count = function (race, region) {
+                    var value = counts[race + '/' + region];
+                    return value === undefined ? null : value;
+                };
+                // Races ordered by their number of executions in the South, most first
+                if (regions.indexOf('South') >= 0) {
+                    var south = function (race) { var value = count(race, 'South'); return value === null ? -Infinity : value; };
+                    races.sort(function (a, b) { return south(b) - south(a) || 0; });
+                }
+                var colors = geyserColors(figure);
+                var traces = regions.map(function (region, i) {
+                    return {type: 'bar', x: races, y: races.map(function (race) { return count(race, region); }),
+                            name: region, marker: {color: colors[i]}};
+                });
+                return withData(figure, traces);
+            }
+        }
+    });
+})();
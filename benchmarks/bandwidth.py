@@ -0,0 +1,117 @@
+# Report the bytes on the wire of each dashboard interaction, with and without response
+# compression.
+#
+#   python benchmarks/bandwidth.py [--encoding 'gzip, deflate, br']
+#
+# Interactions are replayed through the Flask test client the way the browser makes them:
+#   first visit     the page, every script and stylesheet it links, the layout, the callback
+#                   graph, the logo and the six charts of the default view
+#   repeat visit    the same with a browser cache: resources with a max-age are not fetched,
+#                   the others are revalidated with their ETag
+#   slider          the six charts after moving the year range
+#   sex             the six charts after choosing a sex
+#   race            the map after choosing a race
+#
+# Bytes are the response bodies plus their status line and headers. Precomputed responses are
+# disabled, so every chart goes through the callbacks.
+
+# Import packages
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPLAY = '''
+import gzip, json, re, sys
+import app
+
+client = app.server.test_client()
+encoding = sys.argv[1]
+inputs = ['range_slider', 'sex_dropdown', 'volunteer_checkbox', 'foreign_checkbox', 'race_dropdown']
+charts = [graph_id for graph_id, _, _ in app.figure_callbacks]
+cache = {}
+
+def size(response):
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+    return len(f'HTTP/1.1 {response.status}') + 2 + headers + 2 + len(response.data)
+
+def body(response):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(response.data)
+    return gzip.decompress(response.data) if encoding == 'gzip' else response.data
+
+def get(url, cached=False):
+    if cached and url in cache:
+        headers = cache[url]
+        if 'max-age' in headers.get('Cache-Control', '') and 'max-age=0' not in headers['Cache-Control']:
+            return 0, 0, None
+        response = client.get(url, headers={'Accept-Encoding': encoding, 'If-None-Match': headers.get('ETag', '')})
+    else:
+        response = client.get(url, headers={'Accept-Encoding': encoding})
+    cache[url] = dict(response.headers)
+    return 1, size(response), response
+
+def chart(graph_id, state):
+    names = inputs if graph_id == 'choropleth_map' else inputs[:4]
+    payload = {'output': f'{graph_id}.figure', 'outputs': {'id': graph_id, 'property': 'figure'},
+               'inputs': [{'id': name, 'property': 'value', 'value': value} for name, value in zip(names, state)],
+               'changedPropIds': [], 'state': []}
+    return 1, size(client.post('/_dash-update-component', json=payload, headers={'Accept-Encoding': encoding}))
+
+def charts_of(state, graph_ids=charts):
+    results = [chart(graph_id, state) for graph_id in graph_ids]
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+def visit(cached):
+    requests, total, index = get('/', cached)
+    urls = re.findall(r'(?:src|href)="([^"]+)"', body(index).decode()) if index is not None else []
+    layout = get('/_dash-layout', cached)
+    logo = re.findall(r'/assets/logo.png[^"]*', body(layout[2]).decode().replace('\\\\u002f', '/'))
+    for url in urls + ['/_dash-dependencies'] + logo:
+        r = get(url, cached)
+        requests, total = requests + r[0], total + r[1]
+    r = charts_of([[first, last], None, [], [], None])
+    return requests + layout[0] + r[0], total + layout[1] + r[1]
+
+first, last = int(app.range_slider.min), int(app.range_slider.max)
+interactions = {
+    'first visit': visit(False),
+    'repeat visit': visit(True),
+    'slider': charts_of([[first + 10, last], None, [], [], None]),
+    'sex': charts_of([[first + 10, last], 'Male', [], [], None]),
+    'race': charts_of([[first + 10, last], 'Male', [], [], 'White'], ['choropleth_map']),
+}
+print(json.dumps(interactions))
+'''
+
+
+def replay(compress, encoding):
+    env = dict(os.environ, COMPRESS_RESPONSES='1' if compress else '0', PRECOMPUTED_RESPONSES='0',
+               FIGURE_CACHE_WARMUP='0', FIGURE_CACHE_PATH='', CLIENTSIDE_FILTERING='0', METRICS_DIR='', PROFILE_DIR='')
+    output = subprocess.run([sys.executable, '-c', REPLAY, encoding], cwd=ROOT, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--encoding', default='gzip, deflate, br', help='Accept-Encoding of the simulated browser')
+    args = parser.parse_args()
+
+    before = replay(False, args.encoding)
+    after = replay(True, args.encoding)
+    print(f'{"interaction":<14} {"requests":>8} {"uncompressed":>14} {"compressed":>12} {"saved":>7}')
+    for name in before:
+        requests, old = before[name]
+        new = after[name][1]
+        saved = f'{1 - new / old:.0%}' if old else ''
+        print(f'{name:<14} {requests:>8} {old / 1024:>11.1f} KiB {new / 1024:>8.1f} KiB {saved:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Compare the cold-start time of `import dataset` with and without the on-disk cache.
+#
+# Each measurement runs in a fresh interpreter, exactly like a gunicorn worker boot.
+#   python benchmarks/cold_start.py [--runs 5] [--url https://...]
+#
+# "parse + clean" is the pre-cache path (read_csv + cleaning on every boot) against the local
+# CSV; pass --url to also time it against a remote source, which adds the download.
+
+# Import packages
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# pandas/numpy are imported before the clock starts: their import cost is identical on both paths
+TIMED_IMPORT = ('import time, numpy, pandas; t = time.perf_counter(); import dataset; '
+                'print(time.perf_counter() - t)')
+
+
+def run(env, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', TIMED_IMPORT], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def report(label, timings):
+    print(f'{label:<28} median {statistics.median(timings) * 1000:8.1f} ms   '
+          f'min {min(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--url', help='also time the uncached path against this remote CSV')
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='dataset-cache-')
+    base_env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    try:
+        report('parse + clean (local)', run(dict(base_env, DATASET_CACHE_DIR=''), args.runs))
+        if args.url:
+            report('parse + clean (url)', run(dict(base_env, DATASET_CACHE_DIR='', DATASET_SOURCE=args.url), args.runs))
+
+        cached_env = dict(base_env, DATASET_CACHE_DIR=cache_dir)
+        start = time.perf_counter()
+        run(cached_env, 1)
+        print(f'{"first boot (builds cache)":<28} {(time.perf_counter() - start) * 1000:8.1f} ms wall')
+        report('cached (memory-mapped)', run(cached_env, args.runs))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
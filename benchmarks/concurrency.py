@@ -0,0 +1,140 @@
+# Measure chart request latency under concurrent users, with sync and threaded gunicorn workers.
+#
+#   python benchmarks/concurrency.py [--users 8] [--seconds 20] [--workers 2]
+#
+# Every simulated user is a browser tab with three connections, like the parallel requests of
+# the Dash renderer. Each connection asks for the charts of random filter states: most are
+# states other users already asked for (served from the figure cache), the rest are new
+# year ranges dragged on the slider, which have to be built. Requests carry the tab's client
+# id and sequence number like the renderer's, so superseded ones can be dropped.
+#
+# For each worker configuration it reports the latency percentiles of cached and of built
+# charts, the number of answered requests and the number dropped as stale (204).
+
+# Import packages
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from workers import free_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+charts = ['choropleth_map', 'nested_pie_chart', 'linechart', 'matrix', 'scatter_fig', 'stackedBar']
+inputs = ['range_slider', 'sex_dropdown', 'volunteer_checkbox', 'foreign_checkbox', 'race_dropdown']
+
+# Filter states popular enough to be in the figure cache after the first few requests
+popular = [([1977, 2023], None, [], [], None), ([1977, 2023], 'Male', [], [], None),
+           ([1977, 2023], None, ['yes'], [], None), ([2000, 2023], None, [], [], None)]
+
+configurations = {
+    'sync': {'WORKER_CLASS': 'sync'},
+    'gthread': {'WORKER_CLASS': 'gthread', 'WORKER_THREADS': '8', 'BUILD_CONCURRENCY': '2'},
+}
+
+
+def body(graph_id, state, client, sequence):
+    names = inputs if graph_id == 'choropleth_map' else inputs[:4]
+    return json.dumps({'output': f'{graph_id}.figure', 'outputs': {'id': graph_id, 'property': 'figure'},
+                       'inputs': [{'id': name, 'property': 'value', 'value': value} for name, value in zip(names, state)],
+                       'changedPropIds': [], 'state': [], 'client': client, 'sequence': sequence})
+
+
+def user(port, deadline, results, seed):
+    rng = random.Random(seed)
+    client = f'user{seed}'
+    sequence = iter(range(1, 10**9))
+    lock = threading.Lock()
+
+    def connection():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while time.monotonic() < deadline:
+            if rng.random() < 0.8:
+                kind, state = 'cached', rng.choice(popular)
+            else:
+                first = rng.randint(1977, 2023)
+                kind, state = 'built', ([first, rng.randint(first, 2023)], rng.choice([None, 'Male', 'Female']), [], [], None)
+            with lock:
+                number = next(sequence)
+            start = time.perf_counter()
+            conn.request('POST', '/_dash-update-component', body(rng.choice(charts), state, client, number),
+                         {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+            results.append((kind, response.status, elapsed))
+
+    threads = [threading.Thread(target=connection) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else float('nan')
+
+
+def run(name, settings, users, seconds, workers):
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PRECOMPUTED_RESPONSES='0', FIGURE_CACHE_PATH='',
+               METRICS_DIR='', PROFILE_DIR='', **settings)
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', 'app:server'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/_dash-layout')
+                conn.getresponse().read()
+                break
+            except OSError:
+                if master.poll() is not None:
+                    raise RuntimeError('gunicorn exited during boot')
+                time.sleep(0.1)
+
+        results = []
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=user, args=(port, deadline, results, seed)) for seed in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+
+    print(f'\n{name}: {len(results)} requests in {seconds} s, '
+          f'{sum(status == 204 for _, status, _ in results)} dropped as stale')
+    for kind in ['cached', 'built']:
+        latencies = [elapsed for k, status, elapsed in results if k == kind and status == 200]
+        if latencies:
+            print(f'  {kind:<7} {len(latencies):>6} answered  p50 {statistics.median(latencies) * 1000:8.1f} ms  '
+                  f'p90 {percentile(latencies, 0.9) * 1000:8.1f} ms  p99 {percentile(latencies, 0.99) * 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    # Build the dataset and cube caches first, so no run pays for them
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=ROOT, check=True, capture_output=True)
+
+    for name, settings in configurations.items():
+        run(name, settings, args.users, args.seconds, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Compare what a chart update costs when the callback sends a whole figure against the
+# skeleton + partial update the callbacks now return.
+#
+#   python benchmarks/figures.py [--repeat 20]
+#
+# "full figure" builds a validated plotly figure from the same traces, the way a callback
+# returning px/go figures does, and serializes it with its layout and template. "patch" is the
+# trace dicts from figures.py wrapped in a Dash Patch, as app.py sends them. Bytes are the
+# JSON bodies a browser receives per chart; the figure cache is bypassed so every build is timed.
+
+# Import packages
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('FIGURE_CACHE_WARMUP', '0')
+
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+import figures
+
+# Filter states an interaction session goes through
+states = [
+    ([1977, 2023], None, [], [], None),
+    ([1990, 2000], None, [], [], None),
+    ([1977, 2023], 'Female', [], [], None),
+    ([1977, 2023], None, ['yes'], [], None),
+    ([1977, 2023], None, [], ['Yes'], None),
+    ([1977, 2023], None, [], [], 'Black'),
+]
+
+charts = ['choropleth_map', 'nested_pie_chart', 'linechart', 'matrix', 'scatter_fig', 'stacked_bar']
+
+
+def build(chart, state):
+    years, sex, volunteer, foreign, race = state
+    filtered_cube = app.subset(years, sex, volunteer, foreign)
+    if chart == 'choropleth_map':
+        return figures.choropleth_map(filtered_cube, race)
+    return getattr(figures, chart)(filtered_cube)
+
+
+def full_figure(chart, update):
+    figure = go.Figure(figures.skeletons[chart])
+    figure.add_traces(update['data'])
+    figure.update_layout(update.get('layout', {}))
+    return json.dumps(figure.to_plotly_json(), cls=PlotlyJSONEncoder)
+
+
+def patch(chart, update):
+    return json.dumps(app.as_patch(lambda: update)().to_plotly_json(), cls=PlotlyJSONEncoder)
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"chart":<17} {"full figure":>22} {"patch":>22}')
+    totals = {'full': [0, 0], 'patch': [0, 0]}
+    for chart in charts:
+        row = {}
+        for label, encode in [('full', full_figure), ('patch', patch)]:
+            elapsed, size = 0, 0
+            for state in states:
+                seconds, body = timed(lambda: encode(chart, build(chart, state)), args.repeat)
+                elapsed += seconds
+                size += len(body)
+            row[label] = (elapsed / len(states), size / len(states))
+            totals[label][0] += elapsed / len(states)
+            totals[label][1] += size / len(states)
+        print(f'{chart:<17} ' + ' '.join(f'{row[label][0] * 1000:>8.2f} ms {row[label][1] / 1024:>7.1f} KiB'
+                                         for label in ('full', 'patch')))
+    print(f'{"all charts":<17} ' + ' '.join(f'{totals[label][0] * 1000:>8.2f} ms {totals[label][1] / 1024:>7.1f} KiB'
+                                            for label in ('full', 'patch')))
+    print(f'skeletons sent once with the page: '
+          f'{sum(len(json.dumps(figures.skeletons[chart], cls=PlotlyJSONEncoder)) for chart in charts) / 1024:.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Compare the memory a worker spends on the dataset before and after the compact schema.
+#
+#   python benchmarks/memory.py [--scale 100]
+#
+# "object columns" is the cleaned frame as dataset.clean() returns it (Python strings,
+# int64 counts); "compact schema" is what dataset.load() now returns. Each variant is built
+# in a fresh interpreter and the RSS growth of that process is reported next to the size
+# pandas reports for the frame itself. --scale generates a synthetic dataset that many times
+# larger than the bundled one, to make the difference visible above interpreter noise.
+
+# Import packages
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+
+MEASURE = '''
+import json, resource, sys
+import pandas as pd
+import dataset
+
+def rss():
+    # Current RSS from /proc when available, peak RSS otherwise
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+mode, source, cache_dir = sys.argv[1:]
+before = rss()
+if mode == 'objects':
+    df = dataset.clean(pd.read_csv(source))
+else:
+    df = dataset.load(source, cache_dir)
+print(json.dumps({'rss': rss() - before, 'frame': int(df.memory_usage(deep=True).sum()), 'rows': len(df)}))
+'''
+
+
+# Synthetic CSV with `scale` times the rows of the bundled one (see synthetic.py)
+def scaled_csv(scale, directory):
+    source = os.path.join(ROOT, 'dataset_US_executions.csv')
+    if scale == 1:
+        return source
+    path = os.path.join(directory, f'scaled-{scale}.csv')
+    with open(source) as f:
+        rows = sum(1 for _ in f) - 1
+    synthetic.write(path, rows * scale, source=source)
+    return path
+
+
+def measure(mode, source, cache_dir, env):
+    output = subprocess.run([sys.executable, '-c', MEASURE, mode, source, cache_dir], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=100, help='dataset size as a multiple of the bundled rows')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='dataset-memory-')
+    try:
+        source = scaled_csv(args.scale, directory)
+        cache_dir = os.path.join(directory, 'cache')
+        # The module-level load at `import dataset` reads the bundled file with no cache,
+        # so both variants start from the same baseline
+        env = dict(os.environ, DATASET_CACHE_DIR='')
+        # First call builds the cache so the compact variant measures a normal (cached) boot
+        measure('compact', source, cache_dir, env)
+
+        results = {'objects': measure('objects', source, cache_dir, env),
+                   'compact': measure('compact', source, cache_dir, env)}
+        print(f'{results["objects"]["rows"]} rows')
+        for label, mode in [('object columns', 'objects'), ('compact schema', 'compact')]:
+            result = results[mode]
+            print(f'{label:<16} frame {result["frame"] / 2**20:8.2f} MiB   RSS growth {result["rss"] / 2**20:8.2f} MiB')
+        print(f'{"ratio":<16} frame {results["objects"]["frame"] / results["compact"]["frame"]:8.1f}x')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
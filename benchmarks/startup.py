@@ -0,0 +1,119 @@
+# Profile the import chain of the app and check the worker boot time against a target.
+#
+#   python benchmarks/startup.py [--runs 9] [--target 1.25] [--top 15]
+#
+# A gunicorn worker started without PRELOAD_APP (or by an autoscaler on a new machine) has to
+# `import app` before it can answer: that is its boot time. This times the import in fresh
+# interpreters, from the dataset cache, and prints where it goes according to
+# `python -X importtime`: cumulative time per top-level package, and the time spent in the
+# app's own modules (data loading, cube, figures, layout).
+#
+# The gate is relative, so it holds on any machine: in the same run it also times importing the
+# packages the app can't boot without (Dash, Flask, pandas, NumPy), and exits with status 1
+# when the median boot is over --target times their median, so it can gate a deploy. The
+# import runs with PRELOAD_APP=0, like such a worker, so without the figure warm-up.
+# With PRELOAD_APP=1 workers are forked from a master that already imported the app and boot
+# in milliseconds; see benchmarks/workers.py.
+
+# Import packages
+import argparse
+import glob
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMED = 'import time; t = time.perf_counter(); {}; print(time.perf_counter() - t)'
+
+# What a worker imports at the least: the packages the app is built on
+DEPENDENCIES = 'import dash, flask, numpy, pandas'
+
+# Boot time target of a worker importing the app, as a multiple of the time to import its
+# dependencies. On a 1-CPU machine the app took 1.06-1.13 times as long; before its import
+# path was trimmed (plotly.express, graph objects, the `counts` groupby) it took 1.5 times
+TARGET = 1.25
+
+importtime_line = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def run(args, env):
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+# Import tree of `import app` as (module, own microseconds, cumulative microseconds, children).
+# -X importtime prints a module after the modules it imported, indented one level deeper
+def import_profile(env):
+    children = {}
+    root = None
+    for line in run(['-X', 'importtime', '-c', 'import app'], env).stderr.splitlines():
+        match = importtime_line.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            level = len(indent) // 2
+            node = (module, int(own), int(cumulative), children.pop(level + 1, []))
+            children.setdefault(level, []).append(node)
+            root = node
+    return root
+
+
+# Cumulative import time of each package imported by the app's own modules
+def packages(node, own_modules, totals):
+    for child in node[3]:
+        if child[0] in own_modules:
+            packages(child, own_modules, totals)
+        else:
+            package = child[0].split('.')[0]
+            totals[package] = totals.get(package, 0) + child[2]
+    return totals
+
+
+def walk(node):
+    yield node
+    for child in node[3]:
+        yield from walk(child)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=9)
+    parser.add_argument('--target', type=float, default=TARGET,
+                        help='median boot time to stay under, as a multiple of the median import of the dependencies')
+    parser.add_argument('--top', type=int, default=15, help='packages to list')
+    args = parser.parse_args()
+
+    # A worker importing the app itself, as it does without PRELOAD_APP
+    env = dict(os.environ, PRELOAD_APP='0', FIGURE_CACHE_PATH='', METRICS_DIR='', PROFILE_DIR='')
+    # Build the dataset and cube caches first, like any boot after the first one
+    run(['-c', 'import app'], env)
+
+    root = import_profile(env)
+    own_modules = {os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(ROOT, '*.py'))}
+    print('imports by package (cumulative)')
+    for package, cumulative in sorted(packages(root, own_modules, {}).items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {package:<24} {cumulative / 1000:8.1f} ms')
+    print("app's own modules (excluding their imports)")
+    for module, own, _, _ in sorted((node for node in walk(root) if node[0] in own_modules), key=lambda node: -node[1]):
+        print(f'  {module:<24} {own / 1000:8.1f} ms')
+
+    # Alternated, so a slow spell of the machine weighs on both alike
+    timings = {'dependencies': [], 'app': []}
+    for _ in range(args.runs):
+        for name, code in [('dependencies', DEPENDENCIES), ('app', 'import app')]:
+            timings[name].append(float(run(['-c', TIMED.format(code)], env).stdout.strip().splitlines()[-1]))
+    print()
+    for name, values in timings.items():
+        values.sort()
+        print(f'import {name}: median {statistics.median(values) * 1000:.0f} ms, min {values[0] * 1000:.0f} ms, '
+              f'max {values[-1] * 1000:.0f} ms over {args.runs} runs')
+    ratio = statistics.median(timings['app']) / statistics.median(timings['dependencies'])
+    print(f'boot time {ratio:.2f}x the dependencies (target {args.target:.2f}x)')
+    if ratio > args.target:
+        print('over target')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
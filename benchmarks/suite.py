@@ -0,0 +1,208 @@
+# Benchmark suite for the data pipeline and the chart callbacks, on the bundled dataset and
+# on synthetic datasets (see synthetic.py) 10x, 100x and 1000x its size.
+#
+#   python benchmarks/suite.py [--scales 1 10 100 1000] [--repeat 20] [--output results.json]
+#                              [--compare previous.json]
+#
+# For every scale, in fresh interpreters and without network access:
+#   import       cold `import dataset`, parsing and cleaning (no cache) and from the cache
+#   pipeline     chunked ingestion into the column store, each cleaning stage on its own,
+#                and reading the store back
+#   callbacks    each chart callback for every filter state below, through the Flask test
+#                client: "cold" with the figure and sub-cube caches emptied before every
+#                call, "warm" served from them
+#   memory       peak RSS of the interpreters that ran the pipeline and the callbacks
+#
+# Latencies are reported as percentiles over --repeat runs. The results are written as JSON
+# (by default to benchmarks/results/) and --compare prints the change of every median against
+# an earlier results file.
+
+# Import packages
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from memory import scaled_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Filter states the callbacks are timed on: (range_slider, sex, volunteer, foreign, race)
+filter_states = {
+    'full range': ([1977, 2023], None, [], [], None),
+    'narrow range': ([2000, 2005], None, [], [], None),
+    'male': ([1977, 2023], 'Male', [], [], None),
+    'female': ([1977, 2023], 'Female', [], [], None),
+    'volunteers': ([1977, 2023], None, ['yes'], [], None),
+    'foreign nationals': ([1977, 2023], None, [], ['Yes'], None),
+    'race selected': ([1977, 2023], None, [], [], 'White'),
+}
+
+TIMED_IMPORT = ('import time, numpy, pandas; t = time.perf_counter(); import dataset; '
+                'print(time.perf_counter() - t)')
+
+PIPELINE = '''
+import json, os, resource, shutil, sys, time
+import dataset
+from store import ColumnStore
+
+source, cache_dir, repeat = sys.argv[1], sys.argv[2], int(sys.argv[3])
+timings = {}
+for i in range(repeat):
+    path = os.path.join(cache_dir, f'pipeline-{i}')
+    stages = {}
+    t = time.perf_counter(); dataset.ingest(source, path, timings=stages); total = time.perf_counter() - t
+    for name, seconds in stages.items():
+        timings.setdefault(f'stage {name}', []).append(seconds)
+    timings.setdefault('read_csv + store append', []).append(total - sum(stages.values()))
+    timings.setdefault('ingest (total)', []).append(total)
+    t = time.perf_counter(); df = ColumnStore(path).read(); timings.setdefault('store read', []).append(time.perf_counter() - t)
+    shutil.rmtree(path)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({'rows': len(df), 'timings': timings, 'peak_rss': peak}))
+'''
+
+CALLBACKS = '''
+import json, resource, sys, time
+import app
+
+states, repeat = json.loads(sys.argv[1]), int(sys.argv[2])
+client = app.server.test_client()
+inputs = ['range_slider', 'sex_dropdown', 'volunteer_checkbox', 'foreign_checkbox']
+
+def request(graph_id, state):
+    values = dict(zip(inputs + ['race_dropdown'], state))
+    names = inputs + ['race_dropdown'] if graph_id == 'choropleth_map' else inputs
+    body = {'output': f'{graph_id}.figure', 'outputs': {'id': graph_id, 'property': 'figure'},
+            'inputs': [{'id': name, 'property': 'value', 'value': values[name]} for name in names],
+            'changedPropIds': [], 'state': []}
+    t = time.perf_counter()
+    response = client.post('/_dash-update-component', json=body)
+    elapsed = time.perf_counter() - t
+    assert response.status_code == 200, response.status_code
+    return elapsed, len(response.data)
+
+timings, sizes = {}, {}
+for name, state in states.items():
+    for graph_id, _, _ in app.figure_callbacks:
+        cold, warm = [], []
+        for _ in range(repeat):
+            app.figure_cache.clear()
+            app.subcube_cache.clear()
+            elapsed, size = request(graph_id, state)
+            cold.append(elapsed)
+            warm.append(request(graph_id, state)[0])
+        timings[f'{name} / {graph_id} / cold'] = cold
+        timings[f'{name} / {graph_id} / warm'] = warm
+        sizes[f'{name} / {graph_id}'] = size
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({'timings': timings, 'bytes': sizes, 'peak_rss': peak, 'rows': len(app.df)}))
+'''
+
+
+def python(code, args, env):
+    output = subprocess.run([sys.executable, '-c', code] + [str(arg) for arg in args], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return output.strip().splitlines()[-1]
+
+
+def percentiles(timings):
+    ordered = sorted(timings)
+    def at(q):
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return {'p50': statistics.median(ordered), 'p90': at(0.9), 'p99': at(0.99), 'min': ordered[0],
+            'max': ordered[-1], 'runs': len(ordered)}
+
+
+def run_scale(scale, repeat, directory):
+    source = scaled_csv(scale, directory)
+    cache_dir = os.path.join(directory, f'cache-{scale}')
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', DATASET_SOURCE=source, DATASET_CACHE_DIR=cache_dir,
+               FIGURE_CACHE_WARMUP='0', FIGURE_CACHE_PATH='', CLIENTSIDE_FILTERING='0', METRICS_DIR='', PROFILE_DIR='',
+               PRECOMPUTED_RESPONSES='0')
+    # Slow, large-scale steps are repeated less so the whole suite stays in minutes
+    runs = max(3, repeat // scale) if scale > 1 else repeat
+
+    timings = {}
+    timings['import dataset / parse + clean'] = [float(python(TIMED_IMPORT, [], dict(env, DATASET_CACHE_DIR='')))
+                                                 for _ in range(runs)]
+    python(TIMED_IMPORT, [], env)    # builds the cache
+    timings['import dataset / cached'] = [float(python(TIMED_IMPORT, [], env)) for _ in range(runs)]
+
+    pipeline = json.loads(python(PIPELINE, [source, directory, runs], env))
+    for step, values in pipeline['timings'].items():
+        timings[f'pipeline / {step}'] = values
+
+    callbacks = json.loads(python(CALLBACKS, [json.dumps(filter_states), runs], env))
+    timings.update(callbacks['timings'])
+
+    return {'rows': pipeline['rows'], 'bytes': callbacks['bytes'],
+            'peak_rss': {'pipeline': pipeline['peak_rss'], 'callbacks': callbacks['peak_rss']},
+            'latency': {name: percentiles(values) for name, values in timings.items()}}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, previous=None):
+    for scale, result in results['scales'].items():
+        print(f'\nscale {scale}x: {result["rows"]} rows, peak RSS '
+              f'{result["peak_rss"]["pipeline"] / 2**20:.1f} MiB (pipeline) '
+              f'{result["peak_rss"]["callbacks"] / 2**20:.1f} MiB (callbacks)')
+        before = (previous or {}).get('scales', {}).get(scale, {}).get('latency', {})
+        for name, stats in result['latency'].items():
+            line = (f'  {name:<52} p50 {stats["p50"] * 1000:9.2f} ms  p90 {stats["p90"] * 1000:9.2f} ms  '
+                    f'p99 {stats["p99"] * 1000:9.2f} ms')
+            if name in before:
+                line += f'  {stats["p50"] / before[name]["p50"] - 1:+7.1%}'
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20, help='runs per measurement at scale 1')
+    parser.add_argument('--output', help='results file, benchmarks/results/<date>.json by default')
+    parser.add_argument('--compare', help='earlier results file to compare the medians with')
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    directory = tempfile.mkdtemp(prefix='benchmark-suite-')
+    try:
+        results = {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'filter_states': filter_states,
+            'scales': {str(scale): run_scale(scale, args.repeat, directory) for scale in args.scales},
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f'{results["date"].replace(":", "")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+
+    report(results, previous)
+    print(f'\nresults written to {output}')
+
+if __name__ == '__main__':
+    main()
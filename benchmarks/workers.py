@@ -0,0 +1,92 @@
+# Measure gunicorn boot time and total memory as the worker count grows, with and without
+# the preloaded, memory-mapped dataset.
+#
+#   python benchmarks/workers.py [--workers 1 2 4 8]
+#
+# Memory is the summed PSS (proportional set size) of the master and its workers, so pages
+# shared between processes are only counted once. Linux only (reads /proc).
+
+# Import packages
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def pss(pid):
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def boot(workers, preload):
+    port = free_port()
+    env = dict(os.environ, PRELOAD_APP='1' if preload else '0', WEB_CONCURRENCY=str(workers))
+    start = time.perf_counter()
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', 'app:server'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Ready once every worker answers; hit the server until all of them have served a request
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/_dash-layout', timeout=5).read()
+                if len(children(master.pid)) >= workers:
+                    break
+            except OSError:
+                pass
+            if master.poll() is not None:
+                raise RuntimeError('gunicorn exited during boot')
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        # Give the remaining workers time to finish importing before measuring memory
+        time.sleep(2)
+        memory = pss(master.pid) + sum(pss(child) for child in children(master.pid))
+        return elapsed, memory
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    # Build the dataset and cube caches first, so no run pays for them
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=ROOT, check=True, capture_output=True)
+
+    print(f'{"workers":>7} {"preload":>8} {"ready":>10} {"total PSS":>12} {"per worker":>12}')
+    for preload in (False, True):
+        for workers in args.workers:
+            elapsed, memory = boot(workers, preload)
+            print(f'{workers:>7} {str(preload):>8} {elapsed:>8.2f} s {memory / 2**20:>8.1f} MiB '
+                  f'{memory / 2**20 / workers:>8.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
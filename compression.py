@@ -0,0 +1,116 @@
+# Import packages
+import zlib
+
+import flask
+
+import config
+
+# brotli is optional and not in requirements.txt (`pip install brotli` to enable it): without it
+# responses are only gzipped
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+### RESPONSE COMPRESSION
+# Content-Encoding negotiation and compressors for the server's responses. Brotli is
+# preferred when the package is installed and the client accepts it, gzip otherwise.
+#
+# `init_app` compresses every text or JSON response of at least COMPRESS_MIN_SIZE bytes:
+# callback responses, the layout, the Dash bundles and the CSS/JS assets. Static files and
+# bundles don't change while the server runs, so each is compressed once per encoding and kept.
+# Responses that set their own encoding (precomputed responses, the streamed API) pass through.
+
+GZIP_LEVEL = 6
+
+# Brotli's default quality (11) is meant for offline compression and far too slow per request
+BROTLI_QUALITY = 5
+
+compressible = {'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html',
+                'text/plain', 'text/csv', 'image/svg+xml'}
+
+
+# Best encoding both the server and the client of `request` support, or None
+def negotiate(request):
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+class Compressor:
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            raise ValueError(f'Unsupported encoding {encoding!r}')
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self.compressor.process(data)
+        return self.compressor.compress(data)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+# Compress the str or bytes chunks of a streamed body as they are produced
+def compress_stream(chunks, encoding):
+    if encoding is None:
+        yield from (chunk.encode() if isinstance(chunk, str) else chunk for chunk in chunks)
+        return
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress(data, encoding):
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+# Compress the responses of `server` for the clients that accept it
+def init_app(server):
+    # (path, ETag, encoding) -> compressed body of a static file or Dash bundle
+    static_bodies = {}
+
+    @server.after_request
+    def compress_response(response):
+        if (not config.COMPRESS_RESPONSES or response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in compressible
+                # Streamed bodies are compressed by whoever streams them (see api.py)
+                or (response.is_streamed and not response.direct_passthrough)):
+            return response
+        response.vary.add('Accept-Encoding')
+        length = response.content_length
+        if length is None:
+            length = len(response.get_data())
+        encoding = negotiate(flask.request)
+        if encoding is None or length < config.COMPRESS_MIN_SIZE:
+            return response
+
+        static = response.direct_passthrough or flask.request.path.startswith('/_dash-component-suites/')
+        key = (flask.request.path, response.get_etag()[0] or '', encoding)
+        body = static_bodies.get(key) if static else None
+        if body is None:
+            # Files sent by send_file are read here instead of being passed through
+            response.direct_passthrough = False
+            body = compress(response.get_data(), encoding)
+            if static:
+                static_bodies[key] = body
+        # The file of a send_file response is replaced by the compressed body, close it
+        if hasattr(response.response, 'close'):
+            response.response.close()
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
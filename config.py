@@ -0,0 +1,81 @@
+# Import packages
+import os
+
+### CONFIGURATION
+# Every setting below can be overridden with an environment variable of the same name
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Where the raw executions CSV is read from (a local path or an http(s) URL)
+DATASET_SOURCE = os.environ.get('DATASET_SOURCE', os.path.join(BASE_DIR, 'dataset_US_executions.csv'))
+
+# Directory holding the cleaned, column-per-file dataset cache (empty string disables the cache)
+DATASET_CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+
+# Number of rendered figures each worker keeps in memory (least recently used are evicted first)
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', '512'))
+
+# Memory, in MB, each worker may spend on copies of the filtered sub-cubes the charts share
+SUBSET_CACHE_MB = int(os.environ.get('SUBSET_CACHE_MB', '32'))
+
+# SQLite file shared by all workers as a second figure cache level (empty string disables it)
+FIGURE_CACHE_PATH = os.environ.get('FIGURE_CACHE_PATH', '')
+
+# Maximum number of figures kept in the shared SQLite file
+FIGURE_CACHE_SHARED_SIZE = int(os.environ.get('FIGURE_CACHE_SHARED_SIZE', '4096'))
+
+# Build the figures of the default filter state at boot, before the first visitor asks for them
+FIGURE_CACHE_WARMUP = os.environ.get('FIGURE_CACHE_WARMUP', '1') == '1'
+
+# Import the app in the gunicorn master before forking, so all workers share one loaded dataset
+PRELOAD_APP = os.environ.get('PRELOAD_APP', '1') == '1'
+
+# Filter and aggregate in the browser: the non-empty cube cells are sent once with the page and
+# slider/checkbox changes are handled by clientside callbacks instead of the server
+CLIENTSIDE_FILTERING = os.environ.get('CLIENTSIDE_FILTERING', '0') == '1'
+
+# Above this many non-empty cube cells the dataset is too large to ship to the browser and the
+# server-side callbacks are used even when CLIENTSIDE_FILTERING is on
+CLIENTSIDE_MAX_CELLS = int(os.environ.get('CLIENTSIDE_MAX_CELLS', '50000'))
+
+# Directory where each worker writes its metrics so /metrics can report all workers together
+# (empty string: every worker reports only its own)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
+# Directory for cProfile dumps of slow chart requests (empty string disables profiling)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+
+# Fraction of chart requests run under the profiler, and the duration from which one is kept
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0.01'))
+PROFILE_SLOW_SECONDS = float(os.environ.get('PROFILE_SLOW_SECONDS', '0.25'))
+
+# Rows of the raw CSV cleaned at a time when loading it, which bounds the memory used by the load
+DATASET_CHUNK_SIZE = int(os.environ.get('DATASET_CHUNK_SIZE', '100000'))
+
+# How often (in seconds) a worker checks the dataset cache for appended rows; 0 disables it
+DATASET_RELOAD_INTERVAL = float(os.environ.get('DATASET_RELOAD_INTERVAL', '1'))
+
+# Answer chart requests with the responses pre-rendered by precompute.py, when it has run
+PRECOMPUTED_RESPONSES = os.environ.get('PRECOMPUTED_RESPONSES', '1') == '1'
+
+# Processes rendering the responses in precompute.py (0: one per CPU). Above 0, gunicorn also
+# starts the job in the background when it boots
+PRECOMPUTE_WORKERS = int(os.environ.get('PRECOMPUTE_WORKERS', '0'))
+
+# Number of filter states precompute.py renders, most likely first (0: all of them)
+PRECOMPUTE_LIMIT = int(os.environ.get('PRECOMPUTE_LIMIT', '0'))
+
+# Gunicorn worker class: 'gthread' serves each worker's requests from a pool of threads, so a
+# slow figure build doesn't hold up the others; 'sync' handles one request at a time
+WORKER_CLASS = os.environ.get('WORKER_CLASS', 'gthread')
+
+# Threads per gunicorn worker with the gthread worker class
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', '8'))
+
+# Figures a worker builds at the same time; other requests needing a build wait for a slot
+BUILD_CONCURRENCY = int(os.environ.get('BUILD_CONCURRENCY', '2'))
+
+# Compress text and JSON responses of at least COMPRESS_MIN_SIZE bytes with gzip (or brotli,
+# when the brotli package is installed) for the clients that accept it
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', '1') == '1'
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '500'))
@@ -0,0 +1,9 @@
+# Lets the tests under tests/ import the app's modules from the repository root
+import os
+
+# Tests that import the app use it without the boot-time extras: no warm-up, no shared caches,
+# no metrics or profile files, and every chart built by its callback
+for name in ['FIGURE_CACHE_PATH', 'METRICS_DIR', 'PROFILE_DIR']:
+    os.environ.setdefault(name, '')
+os.environ.setdefault('FIGURE_CACHE_WARMUP', '0')
+os.environ.setdefault('PRECOMPUTED_RESPONSES', '0')
@@ -0,0 +1,236 @@
+# Import packages
+import collections
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import config
+import dataset
+
+### AGGREGATE CUBE
+# Dense count/sum cube over every dimension the dashboard filters or groups by.
+# Each chart is a slice of the cube summed over the dimensions it does not show,
+# so the callbacks never scan or group the raw rows and their cost does not grow
+# with the number of executions in the dataset.
+
+dimensions = ['Execution Year', 'Sex', 'Execution Volunteer', 'Foreign National', 'Race', 'State Code', 'Region']
+
+victims_columns = ['Number of White Victims', 'Number of Black Victims', 'Number of Latino Victims',
+                   'Number of Asian Victims', 'Number of Native American Victims', 'Number of Other Race Victims']
+
+# Last axis of the cube: the number of executions followed by the six victim sums
+measures = ['Executions'] + victims_columns
+
+# Bump this whenever the layout of the cube changes, so stale cached cubes are not reused
+CUBE_VERSION = 1
+
+
+class Cube:
+
+    def __init__(self, values, labels):
+        self.values = values
+        self.labels = labels
+
+    @classmethod
+    def from_frame(cls, df):
+        years = df['Execution Year'].to_numpy()
+        first_year = int(years.min())
+
+        # Years are a contiguous axis so a year range is a plain slice
+        labels = {'Execution Year': list(range(first_year, int(years.max()) + 1))}
+        codes = [years - first_year]
+        for dim in dimensions[1:]:
+            # Sorted categories give the same ordering as a pandas groupby
+            series = df[dim]
+            categories = sorted(series.dropna().unique())
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Recode to the categories present, without going through the values
+                dim_codes = series.cat.set_categories(categories).cat.codes.to_numpy(np.int64)
+            else:
+                dim_codes = pd.Categorical(series, categories=categories).codes.astype(np.int64)
+            # Rows without a value (federal executions have no state code) get a trailing None slot
+            if (dim_codes < 0).any():
+                dim_codes[dim_codes < 0] = len(categories)
+                categories.append(None)
+            labels[dim] = categories
+            codes.append(dim_codes)
+
+        shape = tuple(len(labels[dim]) for dim in dimensions)
+        flat = np.ravel_multi_index(codes, shape)
+        size = int(np.prod(shape))
+
+        values = np.empty(shape + (len(measures),), dtype=np.int32)
+        values[..., 0] = np.bincount(flat, minlength=size).reshape(shape)
+        for i, col in enumerate(victims_columns, start=1):
+            values[..., i] = np.bincount(flat, weights=df[col].to_numpy(), minlength=size).reshape(shape)
+
+        cube = cls(values, labels)
+        # State names for the choropleth hover, looked up by state code
+        states = df.dropna(subset=['State Code']).drop_duplicates('State Code')
+        cube.state_names = dict(zip(states['State Code'], states['State']))
+        return cube
+
+    # Store the cube as a .npy file (plus its labels) that other processes can memory-map
+    def save(self, path):
+        def write(directory):
+            np.save(os.path.join(directory, 'values.npy'), self.values)
+            with open(os.path.join(directory, 'labels.json'), 'w') as f:
+                json.dump({'labels': self.labels, 'state_names': self.state_names}, f)
+
+        dataset.write_directory(path, write)
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, 'labels.json')) as f:
+            meta = json.load(f)
+        cube = cls(np.load(os.path.join(path, 'values.npy'), mmap_mode='r'), meta['labels'])
+        cube.state_names = meta['state_names']
+        return cube
+
+    # Return a view of the cube restricted to an inclusive year range and/or single values of
+    # other dimensions; a falsy filter value keeps the whole dimension
+    def select(self, years=None, filters=None):
+        key = [slice(None)] * len(dimensions)
+        labels = dict(self.labels)
+        if years is not None:
+            all_years = self.labels['Execution Year']
+            first = min(max(years[0] - all_years[0], 0), len(all_years))
+            last = min(max(years[1] - all_years[0] + 1, first), len(all_years))
+            key[0] = slice(first, last)
+            labels['Execution Year'] = all_years[first:last]
+        for dim, value in (filters or {}).items():
+            if not value:
+                continue
+            axis = dimensions.index(dim)
+            position = self.labels[dim].index(value) if value in self.labels[dim] else len(self.labels[dim])
+            key[axis] = slice(position, position + 1)
+            labels[dim] = self.labels[dim][position:position + 1]
+        cube = Cube(self.values[tuple(key)], labels)
+        cube.state_names = self.state_names
+        return cube
+
+    # Sum over every dimension not in `keep`; the result has the kept dimensions in the
+    # given order followed by the measures axis
+    def total(self, keep):
+        axes = [dimensions.index(dim) for dim in keep]
+        other = tuple(axis for axis in range(len(dimensions)) if axis not in axes)
+        summed = self.values.sum(axis=other)
+        # Remaining axes come out in cube order; move them into the order of `keep`
+        order = sorted(range(len(axes)), key=lambda i: axes[i])
+        return np.moveaxis(summed, range(len(axes)), order)
+
+    # Long-format frame with one row per non-empty group, like `groupby(keep).size()`,
+    # plus the victim sums of each group
+    def frame(self, keep, name='Executions'):
+        totals = self.total(keep)
+        counts = totals[..., 0]
+        index = np.nonzero(counts)
+        data = {}
+        for dim, positions in zip(keep, index):
+            labels = self.labels[dim]
+            # Keep numeric labels (years) numeric; object only when a None slot is present
+            data[dim] = np.asarray(labels, dtype=object if None in labels else None)[positions]
+        data[name] = counts[index]
+        for i, col in enumerate(victims_columns, start=1):
+            data[col] = totals[..., i][index]
+        return pd.DataFrame(data)
+
+    # Cube of the rows of both cubes. Labels are merged (years stay one contiguous range, other
+    # labels sorted with None last) and both cubes' values are added into the merged shape
+    def add(self, other):
+        labels = {}
+        for dim in dimensions:
+            if dim == 'Execution Year':
+                years = self.labels[dim] + other.labels[dim]
+                labels[dim] = list(range(min(years), max(years) + 1))
+            else:
+                values = set(self.labels[dim]) | set(other.labels[dim])
+                labels[dim] = sorted(values - {None}) + ([None] if None in values else [])
+
+        values = np.zeros(tuple(len(labels[dim]) for dim in dimensions) + (len(measures),), dtype=np.int32)
+        for cube in (self, other):
+            positions = [[labels[dim].index(label) for label in cube.labels[dim]] for dim in dimensions]
+            values[np.ix_(*positions, range(len(measures)))] += cube.values
+
+        cube = Cube(values, labels)
+        cube.state_names = {**self.state_names, **other.state_names}
+        return cube
+
+    # JSON-ready sparse form of the cube for the browser: the labels plus, for every non-empty
+    # cell, its position along each dimension and its measures, as one array per column
+    def cells(self):
+        flat = self.values.reshape(-1, len(measures))
+        index = np.flatnonzero(flat[:, 0])
+        positions = np.unravel_index(index, self.values.shape[:-1])
+        columns = {dim: codes.tolist() for dim, codes in zip(dimensions, positions)}
+        for i, measure in enumerate(measures):
+            columns[measure] = flat[index, i].tolist()
+        return {'dimensions': dimensions, 'measures': measures, 'labels': self.labels,
+                'state_names': self.state_names, 'cells': columns}
+
+
+# Filtered sub-cubes memoized by filter state, bounded by the memory of their values rather
+# than their number: a wide year range is a copy of most of the cube. Only values the entry
+# owns count; a view of the memory-mapped cube shares its pages with every worker. Least
+# recently used entries are dropped first once the total is over `maxbytes`.
+class SubcubeCache:
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def size(cube):
+        return cube.values.nbytes if cube.values.flags.owndata else 0
+
+    def get(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        cube = build()
+        size = self.size(cube)
+        if size > self.maxbytes:
+            return cube
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = cube
+                self.nbytes += size
+            self.entries.move_to_end(key)
+            while self.nbytes > self.maxbytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= self.size(evicted)
+        return cube
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+def cube_path(version, cache_dir=None):
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    return os.path.join(cache_dir, f'cube-v{CUBE_VERSION}-{version}')
+
+
+# Cube of `df`, memory-mapped from the dataset cache directory: the first process to need it
+# builds and saves it, every other worker attaches to the same pages instead of rebuilding
+def load_cube(df, cache_dir=None):
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    version = df.attrs.get('version')
+    if not cache_dir or not version:
+        cube = Cube.from_frame(df)
+    else:
+        path = cube_path(version, cache_dir)
+        if not os.path.isdir(path):
+            Cube.from_frame(df).save(path)
+        cube = Cube.open(path)
+    # Lets the caches of sub-cubes and figures tell which data an entry was built from
+    cube.version = version or ''
+    return cube
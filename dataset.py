@@ -1,45 +1,24 @@
 # Import packages
-import pandas as pd
-
-### DATA IMPORTING AND TREATMENT
-
-# Specify the path to CSV file
-file_path = 'https://raw.githubusercontent.com/mafaldamartins1/ProjectDV/main/dataset_US_executions.csv'
-
-# Read the CSV file into a pandas dataframe
-df = pd.read_csv(file_path)
-
-# Remove space in the beginning of ' Male' from the 'Sex' column
-df['Sex'] = df['Sex'].replace(' Male','Male')
-
-# Join 'no' values with 'No' in the 'Foreign National' column
-df['Foreign National'] = df['Foreign National'].replace('no','No')
-
-# Change the type of the 'Execution Date' column to Date
-df['Execution Date'] = pd.to_datetime(df['Execution Date'])
-df['Execution Year'] = df['Execution Date'].dt.year
-
-# Join both 'White' values of column 'Race' together
-df.loc[df['Race'].str.startswith('White'), 'Race'] = 'White'
-# Join both 'South' values of column 'Region' together
-df.loc[df['Region'].str.startswith('South'), 'Region'] = 'South'
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
 
-# Remove space in the end of 'Oklahoma ' from the 'State' column
-df['State'] = df['State'].replace('Oklahoma ','Oklahoma')
+import numpy as np
+import pandas as pd
 
-# Join 'Multiple' and 'Multiple (including White)' in the 'Victim(s) Race(s)' column
-df['Victim(s) Race(s)'] = df['Victim(s) Race(s)'].replace('Multiple (including White)','Multiple')
+import config
+from store import ColumnStore
 
-# Remove columns with missing values - 'Middle Name(s)' and 'Suffix'
-df.drop(columns=["Middle Name(s)", "Suffix"])
+### DATA IMPORTING AND TREATMENT
 
-# Create new columns for the number of victims per race
-df['Number of White Victims'] = df['Number of White Male Victims'] + df['Number of White Female Victims']
-df['Number of Black Victims'] = df['Number of Black Male Victims'] + df['Number of Black Female Victims']
-df['Number of Latino Victims'] = df['Number of Latino Male Victims'] + df['Number of Latino Female Victims']
-df['Number of Asian Victims'] = df['Number of Asian Male Victims'] + df['Number of Asian Female Victims']
-df['Number of Native American Victims'] = df['Number of Native American Male Victims'] + df['Number of American Indian or Alaska Native Female Victims']
-df['Number of Other Race Victims'] = df['Number of Other Race Male Victims'] + df['Number of Other Race Female Victims']
+# Bump this whenever the cleaning steps below change, so stale caches are not reused
+CACHE_VERSION = 3
 
 state_codes = {
     'Alabama': 'AL',
@@ -93,19 +72,343 @@ state_codes = {
     'Wisconsin': 'WI',
     'Wyoming': 'WY'
 }
-df['Race'] = df['Race'].replace('American Indian or Alaska Native','Native American')
-
-# Create a new column in your dataframe that maps state names to state codes
-df['State Code'] = df['State'].map(state_codes)
 
-# Drop columns that won't be used
-df = df.drop(['Last Name', 'Middle Name(s)', 'Juvenile', 'First Name', 'Suffix', 'Number of White Male Victims', 'Number of Black Male Victims',
+# Columns that won't be used by the dashboard
+dropped_columns = ['Last Name', 'Middle Name(s)', 'Juvenile', 'First Name', 'Suffix', 'Number of White Male Victims', 'Number of Black Male Victims',
         'Number of Latino Male Victims', 'Number of Asian Male Victims',
         'Number of Native American Male Victims',
         'Number of Other Race Male Victims', 'Number of White Female Victims',
         'Number of Black Female Victims', 'Number of Latino Female Victims',
         'Number of Asian Female Victims',
         'Number of American Indian or Alaska Native Female Victims',
-        'Number of Other Race Female Victims', 'Victim(s) Race(s)'], axis=1)
+        'Number of Other Race Female Victims', 'Victim(s) Race(s)']
+
+
+### CLEANING PIPELINE
+# The cleaning is a list of stages, each a vectorized function from a frame to a frame that
+# only looks at the rows it is given. The pipeline can therefore run on the whole file at
+# once or chunk by chunk with the same result, and loading a file of any size only ever
+# holds one chunk of raw rows in memory.
+
+# Remove space in the beginning of ' Male' from the 'Sex' column
+def fix_sex(df):
+    df['Sex'] = df['Sex'].replace(' Male','Male')
+    return df
+
+
+# Join 'no' values with 'No' in the 'Foreign National' column
+def fix_foreign_national(df):
+    df['Foreign National'] = df['Foreign National'].replace('no','No')
+    return df
+
+
+# Change the type of the 'Execution Date' column to Date (dates are stored as m/d/yy)
+def parse_execution_date(df):
+    df['Execution Date'] = pd.to_datetime(df['Execution Date'], format='%m/%d/%y')
+    df['Execution Year'] = df['Execution Date'].dt.year
+    return df
+
+
+# Join both 'White' values of column 'Race' together
+def join_white_races(df):
+    df.loc[df['Race'].str.startswith('White'), 'Race'] = 'White'
+    return df
+
+
+# Join both 'South' values of column 'Region' together
+def join_south_regions(df):
+    df.loc[df['Region'].str.startswith('South'), 'Region'] = 'South'
+    return df
+
+
+# Remove space in the end of 'Oklahoma ' from the 'State' column
+def fix_state(df):
+    df['State'] = df['State'].replace('Oklahoma ','Oklahoma')
+    return df
+
+
+# Join 'Multiple' and 'Multiple (including White)' in the 'Victim(s) Race(s)' column
+def join_multiple_victim_races(df):
+    df['Victim(s) Race(s)'] = df['Victim(s) Race(s)'].replace('Multiple (including White)','Multiple')
+    return df
+
+
+# Create new columns for the number of victims per race
+def sum_victims_by_race(df):
+    df['Number of White Victims'] = df['Number of White Male Victims'] + df['Number of White Female Victims']
+    df['Number of Black Victims'] = df['Number of Black Male Victims'] + df['Number of Black Female Victims']
+    df['Number of Latino Victims'] = df['Number of Latino Male Victims'] + df['Number of Latino Female Victims']
+    df['Number of Asian Victims'] = df['Number of Asian Male Victims'] + df['Number of Asian Female Victims']
+    df['Number of Native American Victims'] = df['Number of Native American Male Victims'] + df['Number of American Indian or Alaska Native Female Victims']
+    df['Number of Other Race Victims'] = df['Number of Other Race Male Victims'] + df['Number of Other Race Female Victims']
+    return df
+
+
+def rename_native_american(df):
+    df['Race'] = df['Race'].replace('American Indian or Alaska Native','Native American')
+    return df
+
+
+# Create a new column in your dataframe that maps state names to state codes
+def add_state_codes(df):
+    df['State Code'] = df['State'].map(state_codes)
+    return df
+
+
+# Drop columns that won't be used
+def drop_columns(df):
+    return df.drop(dropped_columns, axis=1)
+
+
+cleaning_stages = [fix_sex, fix_foreign_national, parse_execution_date, join_white_races, join_south_regions,
+                   fix_state, join_multiple_victim_races, sum_victims_by_race, rename_native_american,
+                   add_state_codes, drop_columns]
+
+
+# Run `df` through `stages`; when `timings` is given, the seconds spent in each stage are added to it
+def run_stages(df, stages, timings=None):
+    for stage in stages:
+        start = time.perf_counter()
+        df = stage(df)
+        if timings is not None:
+            timings[stage.__name__] = timings.get(stage.__name__, 0.0) + time.perf_counter() - start
+    return df
+
+
+def clean(df):
+    return run_stages(df, cleaning_stages)
+
+
+### COMPACT SCHEMA
+# Column types of the cleaned dataset. Strings become categoricals with a fixed category
+# order (alphabetical, like a groupby would sort them) and counts use the narrowest integer
+# type that fits, so each worker holds a fraction of the object-column frame.
+
+schema = {
+    'Execution Volunteer': ['no', 'yes'],
+    'Number of Victims': 'int16',
+    'Race': ['Asian', 'Black', 'Latinx', 'Native American', 'Other Race', 'White'],
+    'Sex': ['Female', 'Male'],
+    'Region': ['Midwest', 'Northeast', 'South', 'West'],
+    'Country': ['United States'],
+    'State': sorted(list(state_codes) + ['Federal']),
+    'Foreign National': ['No', 'Yes'],
+    'Execution Date': 'datetime64[s]',
+    'Execution Year': 'int16',
+    'Number of White Victims': 'int8',
+    'Number of Black Victims': 'int8',
+    'Number of Latino Victims': 'int8',
+    'Number of Asian Victims': 'int8',
+    'Number of Native American Victims': 'int8',
+    'Number of Other Race Victims': 'int8',
+    'State Code': sorted(state_codes.values()),
+}
+
+
+def enforce_schema(df):
+    missing = [col for col in schema if col not in df.columns]
+    if missing:
+        raise ValueError(f'Dataset is missing columns {missing}')
+
+    columns = {}
+    for col, kind in schema.items():
+        series = df[col]
+        if isinstance(kind, list):
+            # Any value outside the fixed categories would silently become NaN, so refuse it
+            unknown = set(series.dropna().unique()) - set(kind)
+            if unknown:
+                raise ValueError(f'Unexpected values in column {col!r}: {sorted(unknown)}')
+            columns[col] = pd.Categorical(series, categories=kind)
+        elif kind.startswith('datetime64'):
+            columns[col] = series.astype(kind)
+        else:
+            info = np.iinfo(kind)
+            if len(series) and (series.min() < info.min or series.max() > info.max):
+                raise ValueError(f'Column {col!r} does not fit in {kind}')
+            columns[col] = series.astype(kind)
+    return pd.DataFrame(columns, index=df.index)
+
+
+# Raw rows to the compact schema
+pipeline = cleaning_stages + [enforce_schema]
+
+
+### ON-DISK CACHE
+# The cleaned dataset is stored in a ColumnStore (see store.py), in a directory named after
+# the cache version and the hash of the source file, so every column can be memory-mapped
+# on later boots. The source is read in chunks of DATASET_CHUNK_SIZE rows, each cleaned and
+# appended to the store on its own.
+#
+# The version found for a source is recorded in sources.json in the cache directory along
+# with cheap metadata of the source: size and modification time of a local file, ETag and
+# Last-Modified of a URL. While the metadata is unchanged, boots take the recorded version
+# instead of hashing (or downloading) the whole source again. A URL that can't be reached
+# falls back to its recorded version, so a warm cache boots without the network.
+
+# Seconds to wait for a remote source to answer the metadata request
+SOURCE_TIMEOUT = 10
+
+
+def is_remote(source):
+    return source.startswith(('http://', 'https://'))
+
+
+# Metadata of a response that changes with its content, or None when the server sends none
+def validators(headers):
+    metadata = {name: headers[name] for name in ('ETag', 'Last-Modified') if headers.get(name)}
+    return metadata or None
+
+
+def source_metadata(source):
+    if not is_remote(source):
+        stat = os.stat(source)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    request = urllib.request.Request(source, method='HEAD')
+    with urllib.request.urlopen(request, timeout=SOURCE_TIMEOUT) as response:
+        return validators(response.headers)
+
+
+# Local path of the source CSV and its metadata, downloading it to a temporary file when it
+# is a URL
+@contextlib.contextmanager
+def local_source(source):
+    if not is_remote(source):
+        # Taken before the file is read, so a change while reading shows on the next boot
+        yield source, source_metadata(source)
+        return
+    with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+        with urllib.request.urlopen(source) as response:
+            metadata = validators(response.headers)
+            shutil.copyfileobj(response, f)
+        f.flush()
+        yield f.name, metadata
+
+
+def source_key(source):
+    return source if is_remote(source) else os.path.abspath(source)
+
+
+def read_sources(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'sources.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_version(source, metadata, version, cache_dir):
+    sources = read_sources(cache_dir)
+    sources[source_key(source)] = {'metadata': metadata, 'version': version}
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, 'sources.json')
+    with open(f'{path}.{os.getpid()}.tmp', 'w') as f:
+        json.dump(sources, f)
+    os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+
+# Version recorded for `source` by an earlier load if the source is unchanged since, else None
+def known_version(source, cache_dir):
+    entry = read_sources(cache_dir).get(source_key(source))
+    if entry is None:
+        return None
+    try:
+        metadata = source_metadata(source)
+    except urllib.error.HTTPError:
+        # The server answers but not to HEAD: download the source to find out
+        return None
+    except OSError:
+        # A remote source that can't be reached: boot on the data cached from it
+        return entry['version'] if is_remote(source) else None
+    return entry['version'] if metadata is not None and metadata == entry['metadata'] else None
+
+
+# Identifies one version of the cleaned data: the cleaning code version plus the source hash.
+# With `extra`, the version the file will have once `extra` is appended to it
+def dataset_version(filename, extra=b''):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(extra)
+    return f'v{CACHE_VERSION}-{digest.hexdigest()[:16]}'
+
+
+def cache_path(version, cache_dir=None):
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    return os.path.join(cache_dir, f'dataset-{version}')
+
+
+# Run `write(directory)` on a temporary directory next to `path`, then rename it into place
+# so concurrent workers never see a half-written cache
+def write_directory(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        write(tmp)
+        os.rename(tmp, path)
+    except OSError:
+        # Another worker finished the same cache first
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Raw CSV rows in chunks of `chunk_size`, each run through the cleaning pipeline
+def read_chunks(filename, chunk_size=None, timings=None):
+    chunk_size = config.DATASET_CHUNK_SIZE if chunk_size is None else chunk_size
+    with pd.read_csv(filename, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield run_stages(chunk, pipeline, timings)
+
+
+# Clean the CSV at `filename` chunk by chunk into a new ColumnStore at `path`
+def ingest(filename, path, chunk_size=None, attrs=None, timings=None):
+    column_store = ColumnStore.create(path, schema, attrs)
+    for chunk in read_chunks(filename, chunk_size, timings):
+        column_store.append(chunk)
+    return column_store
+
+
+def load(source=None, cache_dir=None, chunk_size=None):
+    source = config.DATASET_SOURCE if source is None else source
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        with local_source(source) as (filename, _):
+            df = pd.concat(read_chunks(filename, chunk_size), ignore_index=True)
+            # Lets downstream caches tell which data their entries were computed from
+            df.attrs['version'] = dataset_version(filename)
+            return df
+
+    version = known_version(source, cache_dir)
+    path = cache_path(version, cache_dir) if version else None
+    if path is None or not os.path.isdir(path):
+        with local_source(source) as (filename, metadata):
+            version = dataset_version(filename)
+            path = cache_path(version, cache_dir)
+            if not os.path.isdir(path):
+                write_directory(path, lambda directory: ingest(filename, directory, chunk_size, {'version': version}))
+        if metadata is not None:
+            record_version(source, metadata, version, cache_dir)
+    # The store's own version, which changes with every append (see append.py)
+    df = ColumnStore(path).read()
+    # `path` may be an alias that the next append removes (see append.py), so keep the store's
+    # real directory for `reload`
+    df.attrs['store'] = os.path.realpath(path)
+    return df
+
+
+# The dataset again if rows were appended to the store `df` was read from since, else None
+def reload(df):
+    path = df.attrs.get('store')
+    if path is None:
+        return None
+    column_store = ColumnStore(path)
+    if column_store.attrs.get('version') == df.attrs.get('version'):
+        return None
+    updated = column_store.read()
+    updated.attrs['store'] = path
+    return updated
+
 
-print(df.columns)
\ No newline at end of file
+df = load()
@@ -0,0 +1,119 @@
+# Import packages
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from plotly.utils import PlotlyJSONEncoder
+
+### FIGURE CACHE
+# Rendered figures memoized by (figure name, normalized filter state). The filter space of
+# the dashboard is small, so popular states such as the default full range are built once
+# and served from memory afterwards.
+#
+# Entries live in an in-process LRU. An optional SQLite file shared by every gunicorn
+# worker sits behind it: a worker that misses locally can reuse a figure another worker
+# already built. Keys include the dataset version so a new dataset never serves old figures.
+
+
+class SQLiteBackend:
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS figures '
+                         '(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)')
+
+    # sqlite3 connections can't be shared between threads or forked processes, so each
+    # thread of each process opens its own
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        with self.connection() as conn:
+            row = conn.execute('SELECT value FROM figures WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE figures SET used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key, figure):
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO figures VALUES (?, ?, ?)', (key, json.dumps(figure, cls=PlotlyJSONEncoder), time.time()))
+            # Least recently used rows go first once the table is over its size limit
+            conn.execute('DELETE FROM figures WHERE key IN (SELECT key FROM figures ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                         (self.maxsize,))
+
+
+class FigureCache:
+
+    def __init__(self, maxsize=512, backend=None, version=''):
+        self.maxsize = maxsize
+        self.backend = backend
+        self.version = version
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        with self.lock:
+            version = self.version
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        shared_key = version + ':' + repr(key)
+        figure = self.backend.get(shared_key) if self.backend is not None else None
+        if figure is not None:
+            with self.lock:
+                self.shared_hits += 1
+        else:
+            with self.lock:
+                self.misses += 1
+            figure = build()
+            if self.backend is not None:
+                self.backend.set(shared_key, figure)
+
+        with self.lock:
+            # Built from the previous dataset while `reset` switched to a new one: not kept
+            if version != self.version:
+                return figure
+            self.entries[key] = figure
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return figure
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    # Switch to the figures of a new dataset version, dropping the others
+    def reset(self, version):
+        with self.lock:
+            self.version = version
+            self.entries.clear()
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                    'shared_hits': self.shared_hits, 'misses': self.misses, 'evictions': self.evictions}
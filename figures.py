@@ -0,0 +1,262 @@
+# Import packages
+import json
+import pkgutil
+
+import numpy as np
+from plotly.colors import diverging
+
+from cube import victims_columns
+
+### FIGURES
+# The dark theme is built once as a Plotly template and every figure's layout is built
+# once, at import, as a skeleton without data. Skeletons go into the page layout; a callback
+# then only sends the traces (and the few layout values that depend on them) as a partial
+# update, see `as_patch` in app.py.
+#
+# Each builder below takes the filtered sub-cube shared by the callbacks and returns that
+# update as {'data': [trace dicts], 'layout': {nested layout values}}. Traces are plain dicts
+# with the same properties plotly.express used to generate, so no figure objects are
+# constructed or validated per request.
+
+geyser_colors = diverging.Geyser
+temps_colors = diverging.Temps
+
+race_victims = ['White', 'Black', 'Latinx', 'Asian', 'Native American', 'Other Race']
+
+colors1 = [geyser_colors[0], geyser_colors[2], geyser_colors[4], geyser_colors[6], geyser_colors[1], geyser_colors[5], temps_colors[1], temps_colors[3], temps_colors[5]]
+
+white = dict(color='white')
+transparent = 'rgba(0,0,0,0)'
+
+### TEMPLATE
+# Plotly's default template with the dark theme on top. It is read from plotly's JSON file and
+# kept as a plain dict: building it (and the skeletons) as validated plotly.graph_objects
+# took most of the app's import time.
+
+def merge(base, values):
+    for key, value in values.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+template = json.loads(pkgutil.get_data('plotly', 'package_data/templates/plotly.json'))
+merge(template['layout'], dict(
+    paper_bgcolor=transparent,
+    plot_bgcolor=transparent,
+    title=dict(font=white, x=0.5, y=0.95),
+    xaxis=dict(title=dict(font=white), tickfont=white),
+    yaxis=dict(title=dict(font=white), tickfont=white),
+    legend=dict(title=dict(font=white), font=white, tracegroupgap=0),
+    # Colorscale as the [position, color] pairs plotly validates a list of colors into
+    coloraxis=dict(colorscale=[[i / (len(geyser_colors) - 1), color] for i, color in enumerate(geyser_colors)],
+                   autocolorscale=False, colorbar=dict(title=dict(font=white), tickfont=white))
+))
+
+
+def axis_title(text):
+    return dict(title=dict(text=f'<b>{text}</b>'))
+
+
+### SKELETONS
+
+def skeleton(**layout):
+    return {'data': [], 'layout': dict(layout, template=template)}
+
+
+skeletons = {
+    'choropleth_map': skeleton(
+        height=600,
+        margin=dict(t=60),
+        geo=dict(scope='usa', bgcolor='rgb(30,30,30)', domain=dict(x=[0.0, 1.0], y=[0.0, 1.0])),
+        coloraxis=dict(cmin=0, colorbar=dict(title=dict(text='<b>Number of<br>Executions</b>'))),
+        paper_bgcolor='rgb(30,30,30)',
+        plot_bgcolor='rgb(30,30,30)',
+        font=dict(color='black')
+    ),
+    'nested_pie_chart': skeleton(
+        title=dict(text='<b>Total no. of executions by sex and race</b>', font=dict(size=18)),
+        sunburstcolorway=colors1
+    ),
+    'linechart': skeleton(
+        height=400,
+        title=dict(text='<b>Executions per race over time</b>'),
+        xaxis=axis_title('Execution Year'),
+        yaxis=axis_title('Executions'),
+        legend=dict(title=dict(text='<b>Race</b>'))
+    ),
+    'matrix': skeleton(
+        margin=dict(t=60),
+        title=dict(text="<b>Executioners' race vs victims' race</b>"),
+        xaxis=dict(axis_title("Victim's Race"), scaleanchor='y', constrain='domain'),
+        yaxis=dict(axis_title('Race of the Executed'), autorange='reversed', constrain='domain'),
+        coloraxis=dict(colorbar=dict(title=dict(text='<b>Number of Executions</b>')))
+    ),
+    'scatter_fig': skeleton(
+        title=dict(text='<b>Execution year vs region</b>'),
+        xaxis=axis_title('Execution Year'),
+        yaxis=axis_title('Region'),
+        legend=dict(itemsizing='constant')
+    ),
+    'stacked_bar': skeleton(
+        barmode='stack',
+        title=dict(text='<b>Total no. of executions by race and region</b>'),
+        xaxis=axis_title('Race'),
+        yaxis=dict(axis_title('Number of Executed in log scale'), type='log'),
+        legend=dict(title=dict(text='<b>Region</b>'))
+    ),
+}
+
+
+### VISUALIZATION 1- USA MAP
+
+def choropleth_map(filtered_cube, race_dropdown):
+    # Federal executions have no state code and are left out of the map
+    executions_by_state = filtered_cube.select(filters={'Race': race_dropdown}).frame(['State Code'])
+    executions_by_state = executions_by_state[executions_by_state['State Code'].notna()]
+    codes = executions_by_state['State Code'].tolist()
+    executions = executions_by_state['Executions'].to_numpy()
+    states = [filtered_cube.state_names[code] for code in codes]
+
+    trace = dict(
+        type='choropleth',
+        geo='geo',
+        coloraxis='coloraxis',
+        locationmode='USA-states',
+        locations=codes,
+        z=executions,
+        customdata=[[state, int(count)] for state, count in zip(states, executions)],
+        hovertemplate='State Code=%{location}<br>State=%{customdata[0]}<br>Number of Executions=%{z}<extra></extra>',
+        name=''
+    )
+    cmax = int(executions.max()) if len(executions) else None
+    return {'data': [trace], 'layout': {'coloraxis': {'cmax': cmax}}}
+
+
+### VISUALIZATION 2- NESTED PIE CHART
+
+def nested_pie_chart(filtered_cube):
+    grouped = filtered_cube.frame(['Sex', 'Race'])
+    # One node per (sex, race) pair and one per sex. A sex whose executions are all of one race
+    # takes that race as its color, the others '(?)'; nodes are then ordered by that color, the
+    # same order px.sunburst produces, since the marker colors are assigned by position
+    nodes = [(f'{sex}/{race}', race, sex, int(count), race)
+             for sex, race, count in zip(grouped['Sex'], grouped['Race'], grouped['Executions'])]
+    for sex, group in grouped.groupby('Sex', sort=True, observed=True):
+        color = group['Race'].iloc[0] if group['Race'].nunique() == 1 else '(?)'
+        nodes.append((sex, sex, '', int(group['Executions'].sum()), color))
+    nodes.sort(key=lambda node: node[4])
+    ids, labels, parents, values, colors = (list(column) for column in zip(*nodes)) if nodes else ([], [], [], [], [])
+
+    trace = dict(
+        type='sunburst',
+        ids=ids,
+        labels=labels,
+        parents=parents,
+        values=values,
+        customdata=[[color] for color in colors],
+        branchvalues='total',
+        domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]),
+        marker=dict(colors=colors1),
+        hovertemplate='labels=%{label}<br>Executions=%{value}<br>parent=%{parent}<br>id=%{id}<br>Race=%{customdata[0]}<extra></extra>',
+        name=''
+    )
+    return {'data': [trace]}
+
+
+### VISUALIZATION 3 - LINE CHART
+
+def linechart(filtered_cube):
+    executions_by_race_by_year = filtered_cube.frame(['Race', 'Execution Year'])
+    colorway = template['layout']['colorway']
+
+    traces = []
+    for i, (race, group) in enumerate(executions_by_race_by_year.groupby('Race', sort=True, observed=True)):
+        traces.append(dict(
+            type='scatter',
+            mode='lines',
+            x=group['Execution Year'].to_numpy(),
+            y=group['Executions'].to_numpy(),
+            name=race,
+            legendgroup=race,
+            showlegend=True,
+            line=dict(color=colorway[i % len(colorway)], dash='solid'),
+            marker=dict(symbol='circle'),
+            orientation='v',
+            xaxis='x',
+            yaxis='y',
+            hovertemplate=f'Race={race}<br>Execution Year=%{{x}}<br>Executions=%{{y}}<extra></extra>'
+        ))
+    return {'data': traces}
+
+
+### VISUALIZATION 4 - MATRIX (HEATMAP)
+
+def matrix(filtered_cube):
+    victims_by_race = filtered_cube.frame(['Race'])    # only races with executions
+
+    trace = dict(
+        type='heatmap',
+        coloraxis='coloraxis',
+        x=race_victims,
+        y=victims_by_race['Race'].tolist(),
+        z=victims_by_race[victims_columns].to_numpy(),
+        texttemplate='%{z}',
+        xaxis='x',
+        yaxis='y',
+        hovertemplate="Victim's Race: %{x}<br>Race of the Executed: %{y}<br>color: %{z}<extra></extra>",
+        name='0'
+    )
+    return {'data': [trace]}
+
+
+### VISUALIZATION 5 - SCATTER PLOT
+
+def scatter_fig(filtered_cube):
+    executions_by_year = filtered_cube.frame(['Execution Year', 'Region'])
+    sizes = executions_by_year['Executions'].to_numpy()
+
+    trace = dict(
+        type='scatter',
+        mode='markers',
+        x=executions_by_year['Execution Year'].to_numpy(),
+        y=executions_by_year['Region'].tolist(),
+        # Same bubble scaling as px.scatter with its default size_max of 20
+        marker=dict(color='#028180', size=sizes, sizemode='area', symbol='circle',
+                    sizeref=sizes.max() / 20 ** 2 if len(sizes) else 1),
+        name='',
+        legendgroup='',
+        showlegend=False,
+        orientation='h',
+        xaxis='x',
+        yaxis='y',
+        hovertemplate='Execution Year=%{x}<br>Region=%{y}<br>No_executions=%{marker.size}<extra></extra>'
+    )
+    return {'data': [trace]}
+
+
+### VISUALIZATION 6 - STACKED BAR
+
+def stacked_bar(filtered_cube):
+    # Race x region executions, empty combinations left as NaN so they draw no bar on the log axis
+    race_by_region = filtered_cube.total(['Race', 'Region'])[..., 0].astype(float)
+    races = race_by_region.sum(axis=1) > 0
+    regions = race_by_region.sum(axis=0) > 0
+    race_by_region = race_by_region[races][:, regions]
+    race_by_region[race_by_region == 0] = np.nan
+    race_labels = np.asarray(filtered_cube.labels['Race'], dtype=object)[races]
+    region_labels = np.asarray(filtered_cube.labels['Region'], dtype=object)[regions]
+
+    # Races ordered by their number of executions in the South, most first
+    if 'South' in region_labels:
+        south = race_by_region[:, list(region_labels).index('South')]
+        order = np.argsort(-np.nan_to_num(south, nan=-np.inf), kind='stable')
+        race_by_region = race_by_region[order]
+        race_labels = race_labels[order]
+
+    traces = [dict(type='bar', x=race_labels.tolist(), y=race_by_region[:, i], name=region,
+                   marker=dict(color=geyser_colors[i]))
+              for i, region in enumerate(region_labels)]
+    return {'data': traces}
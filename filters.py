@@ -0,0 +1,67 @@
+# Import packages
+import numpy as np
+import pandas as pd
+
+### FILTER ENGINE
+# Row-level counterpart of the aggregate cube, for consumers that need the matching rows
+# rather than their totals: the row export of the API (/api/executions, see api.py). The
+# charts, the per-state detail and the aggregates use the cube. One packed bitmap is
+# precomputed per value of every categorical column, plus the row order sorted by year. A
+# filter state is answered with a bitwise AND of those bitmaps into a single index vector,
+# without building any intermediate DataFrame.
+
+categorical_columns = ['Sex', 'Race', 'Execution Volunteer', 'Foreign National', 'Region', 'State Code']
+
+
+class FilterEngine:
+
+    def __init__(self, df, columns=None):
+        self.size = len(df)
+        self.bitmaps = {}
+        for col in columns or categorical_columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Compare the small integer codes instead of the values
+                codes = series.cat.codes.to_numpy()
+                categories = series.cat.categories
+                self.bitmaps[col] = {categories[code]: np.packbits(codes == code)
+                                     for code in np.unique(codes[codes >= 0])}
+            else:
+                values = series.to_numpy()
+                self.bitmaps[col] = {value: np.packbits(values == value)
+                                     for value in series.dropna().unique()}
+
+        years = df['Execution Year'].to_numpy()
+        self.year_order = np.argsort(years, kind='stable')
+        self.sorted_years = years[self.year_order]
+
+    def empty(self):
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def full(self):
+        return np.packbits(np.ones(self.size, dtype=bool))
+
+    # Bitmap of the rows in an inclusive year range, from a binary search over the sorted years
+    def year_bitmap(self, first, last):
+        start = np.searchsorted(self.sorted_years, first, side='left')
+        stop = np.searchsorted(self.sorted_years, last, side='right')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.year_order[start:stop]] = True
+        return np.packbits(mask)
+
+    # Combined bitmap for a filter state; `filters` maps column names to a single value and
+    # a falsy value keeps the whole column, like Cube.select
+    def bitmap(self, years=None, filters=None):
+        combined = self.year_bitmap(*years) if years is not None else self.full()
+        for col, value in (filters or {}).items():
+            if not value:
+                continue
+            np.bitwise_and(combined, self.bitmaps[col].get(value, self.empty()), out=combined)
+        return combined
+
+    # Sorted positions of the rows matching a filter state, usable with `df.iloc`
+    def select(self, years=None, filters=None):
+        return np.flatnonzero(np.unpackbits(self.bitmap(years, filters), count=self.size))
+
+    def count(self, years=None, filters=None):
+        return int(np.unpackbits(self.bitmap(years, filters), count=self.size).sum())
@@ -0,0 +1,49 @@
+# Gunicorn settings, picked up automatically by `gunicorn app:server` (see Procfile).
+# The number of workers comes from WEB_CONCURRENCY, which gunicorn reads on its own.
+
+# Import packages
+# (gunicorn reads every module-level name as a setting, and `config` is one of them)
+from config import PRELOAD_APP, WORKER_CLASS, WORKER_THREADS
+
+# Import the app once in the master. The dataset and the aggregate cube are memory-mapped
+# from the cache before the workers are forked, so every worker attaches to the same pages
+# instead of loading its own copy, and a new worker boots without reading any data.
+preload_app = PRELOAD_APP
+
+# Threaded workers by default: while a thread builds a figure, the worker's other threads keep
+# answering requests served from the caches (see BUILD_CONCURRENCY in config.py)
+worker_class = WORKER_CLASS
+threads = WORKER_THREADS
+
+
+# Metrics files left in METRICS_DIR by a previous run would be added to this one's
+def on_starting(server):
+    import metrics
+    metrics.clear()
+
+
+# A preloaded app warmed its figure cache up in the master, and every worker inherits the
+# counters with the warm-up's misses. Each worker counts from zero instead, so /metrics
+# doesn't report them once per worker
+def post_fork(server, worker):
+    if PRELOAD_APP:
+        import app
+        app.figure_cache.reset_stats()
+
+
+# With PRECOMPUTE_WORKERS set, render the responses of the current dataset in the background
+# (see precompute.py); the workers serve them as they are written
+def when_ready(server):
+    from config import BASE_DIR, PRECOMPUTE_WORKERS
+    if PRECOMPUTE_WORKERS:
+        import os
+        import subprocess
+        import sys
+        global precompute_job
+        precompute_job = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'precompute.py')], cwd=BASE_DIR)
+
+
+def on_exit(server):
+    job = globals().get('precompute_job')
+    if job is not None and job.poll() is None:
+        job.terminate()
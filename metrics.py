@@ -0,0 +1,279 @@
+# Import packages
+import cProfile
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import flask
+
+import config
+
+### METRICS
+# Timing and size histograms of the chart callbacks, exposed at /metrics in the Prometheus
+# text format. A chart request is split into stages, each timed exclusive of the stages
+# nested inside it, so the stages of a request add up to its total time:
+#
+#   reload     switching to appended data, when there is some (`refresh` in app.py)
+#   lookup     looking the response up in the store written by precompute.py, which ends
+#              the request when it is there (`serve_precomputed` in app.py)
+#   filter     selecting the filtered sub-cube (`subset`)
+#   cache      looking the figure up in the figure cache
+#   queue      waiting for a build slot, on a cache miss (see BUILD_CONCURRENCY)
+#   build      building the traces in figures.py, on a cache miss
+#   patch      wrapping the update into a Dash Patch
+#   serialize  everything outside the callback: Dash decoding the inputs and serializing
+#              the response
+#
+# Each gunicorn worker keeps its own metrics. With METRICS_DIR set, workers also write them
+# to that directory and /metrics serves the sum over all workers, whichever one answers.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+
+    def __init__(self, name, help, labelnames, buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Label values -> count per bucket (not cumulative), then the total count and sum
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self.lock:
+            series = self.series.setdefault(labelvalues, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def state(self):
+        with self.lock:
+            return {json.dumps(labelvalues): list(series) for labelvalues, series in self.series.items()}
+
+    def render(self, state):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, series in sorted(state.items()):
+            labels = dict(zip(self.labelnames, json.loads(key)))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(dict(labels, le=repr(float(bound))))} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels(dict(labels, le="+Inf"))} {series[-2]}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {series[-2]}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {series[-1]!r}')
+        return lines
+
+
+# Counter whose value is read from `collect` when the metrics are rendered
+class Counter:
+
+    def __init__(self, name, help, collect):
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def state(self):
+        return {'[]': [self.collect()]}
+
+    def render(self, state):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter',
+                f'{self.name} {sum(series[0] for series in state.values())}']
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+stage_seconds = Histogram('dashboard_stage_seconds', 'Time spent in each stage of a chart request',
+                          ('figure', 'stage'), LATENCY_BUCKETS)
+request_seconds = Histogram('dashboard_request_seconds', 'Total time of a chart request',
+                            ('figure',), LATENCY_BUCKETS)
+response_bytes = Histogram('dashboard_response_bytes', 'Size of the chart response body',
+                           ('figure',), SIZE_BUCKETS)
+
+registry = [stage_seconds, request_seconds, response_bytes]
+
+
+def counter(name, help, collect):
+    registry.append(Counter(name, help, collect))
+
+
+### REQUEST STAGES
+
+local = threading.local()
+
+
+class stage:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.record = getattr(local, 'record', None)
+        if self.record is not None:
+            self.record['stack'].append(0.0)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.record is not None:
+            elapsed = time.perf_counter() - self.start
+            nested = self.record['stack'].pop()
+            stages = self.record['stages']
+            stages[self.name] = stages.get(self.name, 0.0) + elapsed - nested
+            if self.record['stack']:
+                self.record['stack'][-1] += elapsed
+        return False
+
+
+def start_request(figure):
+    local.record = {'figure': figure, 'start': time.perf_counter(), 'stages': {}, 'stack': [], 'profile': None}
+    if config.PROFILE_DIR and random.random() < config.PROFILE_SAMPLE_RATE:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running in this process
+            return
+        local.record['profile'] = profile
+
+
+def finish_request(size):
+    record = getattr(local, 'record', None)
+    if record is None:
+        return
+    local.record = None
+    elapsed = time.perf_counter() - record['start']
+    if record['profile'] is not None:
+        record['profile'].disable()
+
+    figure, stages = record['figure'], record['stages']
+    stages['serialize'] = max(elapsed - sum(stages.values()), 0.0)
+    for name, seconds in stages.items():
+        stage_seconds.observe(seconds, figure, name)
+    request_seconds.observe(elapsed, figure)
+    response_bytes.observe(size, figure)
+
+    if record['profile'] is not None and elapsed >= config.PROFILE_SLOW_SECONDS:
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}.{int(time.time() * 1000) % 1000:03d}-{os.getpid()}-{figure}-{elapsed * 1000:.0f}ms.prof'
+        record['profile'].dump_stats(os.path.join(config.PROFILE_DIR, name))
+    schedule_save()
+
+
+### SHARED STATE
+
+save_lock = threading.Lock()
+flusher_pid = None
+
+
+def snapshot():
+    return {metric.name: metric.state() for metric in registry}
+
+
+# Write this worker's metrics to METRICS_DIR
+def save():
+    with save_lock:
+        os.makedirs(config.METRICS_DIR, exist_ok=True)
+        path = os.path.join(config.METRICS_DIR, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+
+# Save the metrics once a second from a background thread of the worker, started on its
+# first request (a thread started before gunicorn forks would not exist in the workers)
+def schedule_save():
+    global flusher_pid
+    if not config.METRICS_DIR or flusher_pid == os.getpid():
+        return
+    flusher_pid = os.getpid()
+
+    def flush():
+        while True:
+            time.sleep(1)
+            save()
+
+    threading.Thread(target=flush, name='metrics-flush', daemon=True).start()
+
+
+# Forget the metrics of a previous run, called once before the workers start
+def clear():
+    for path in glob.glob(os.path.join(config.METRICS_DIR, '*.json')) if config.METRICS_DIR else []:
+        os.remove(path)
+
+
+def merge(states):
+    merged = {}
+    for state in states:
+        for name, series in state.items():
+            target = merged.setdefault(name, {})
+            for key, values in series.items():
+                target[key] = [a + b for a, b in zip(target[key], values)] if key in target else list(values)
+    return merged
+
+
+def render():
+    states = [snapshot()]
+    if config.METRICS_DIR:
+        save()
+        states = []
+        for path in glob.glob(os.path.join(config.METRICS_DIR, '*.json')):
+            try:
+                with open(path) as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    state = merge(states)
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render(state.get(metric.name, {})))
+    return '\n'.join(lines) + '\n'
+
+
+### SERVER
+
+callback_output = re.compile(r'^\.*([^.]+)\.')
+
+
+# Time every Dash callback request of `server` and serve the metrics at /metrics
+def init_app(server):
+
+    @server.before_request
+    def before_request():
+        if flask.request.path.endswith('/_dash-update-component'):
+            body = flask.request.get_json(silent=True) or {}
+            match = callback_output.match(body.get('output', ''))
+            start_request(match.group(1) if match else 'unknown')
+
+    @server.after_request
+    def after_request(response):
+        if getattr(local, 'record', None) is not None:
+            finish_request(response.calculate_content_length() or 0)
+        return response
+
+    # A request that failed before after_request still has its record and maybe a running profiler
+    @server.teardown_request
+    def teardown_request(exc):
+        record = getattr(local, 'record', None)
+        if record is not None:
+            local.record = None
+            if record['profile'] is not None:
+                record['profile'].disable()
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,191 @@
+# Pre-render the response of every chart for every filter state into an on-disk store.
+#
+#   python precompute.py [--workers N] [--limit N]
+#
+# The filter states of the dashboard are finite: every year range of the slider, times the
+# sex dropdown, the two checkboxes and, for the map, the race dropdown. A process pool renders
+# the Dash response of each chart for each state, exactly as the callback would send it, and
+# the gzipped bytes are written to a SQLite file in the dataset cache directory. The server
+# then answers a chart request with a key lookup and a copy of those bytes (`serve_precomputed`
+# in app.py), without filtering or building anything.
+#
+# States are rendered most likely first (the default view, then single filters, then ranges
+# moved by one handle...), and --limit stops after that many states. The store is named after
+# the dataset version, so a changed or appended dataset never gets old responses; rerun the job
+# for the new version. Responses already in the store are skipped, so an interrupted run
+# resumes where it stopped.
+
+# Import packages
+import argparse
+import concurrent.futures
+import glob
+import gzip
+import os
+import sqlite3
+import threading
+
+from plotly.io.json import to_json_plotly
+
+import config
+
+# Bump this whenever the figures or the callback responses change, so stored responses of the
+# old code are not served
+PRECOMPUTE_VERSION = 1
+
+# Chart responses rendered per task sent to the pool
+BATCH_SIZE = 200
+
+
+def store_path(version, cache_dir=None):
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    return os.path.join(cache_dir, f'responses-v{PRECOMPUTE_VERSION}-{version}.sqlite')
+
+
+# Store key of a chart for a normalized filter state (see `filter_key` in app.py)
+def state_key(graph_id, key):
+    years, sex, race, volunteer, foreign = key
+    return f'{graph_id}:{years[0]}-{years[1]}:{sex or ""}:{race or ""}:{int(volunteer)}{int(foreign)}'
+
+
+class ResponseStore:
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+        self.local = threading.local()
+
+    # Read-only connection to the store of `version`, per thread and process like the figure
+    # cache's; None while the job hasn't created it
+    def connection(self, version):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid() or self.local.version != version:
+            path = store_path(version, self.cache_dir)
+            if not os.path.exists(path):
+                return None
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=5)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+            self.local.version = version
+        return conn
+
+    # Gzipped response body stored for `key`, or None
+    def get(self, version, key):
+        if not self.cache_dir or not version:
+            return None
+        conn = self.connection(version)
+        if conn is None:
+            return None
+        row = conn.execute('SELECT body FROM responses WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+
+# The dashboard, imported without the work a serving process does at boot. Pool workers call
+# it too: forked ones already have it, spawned ones import it here
+def load_app():
+    config.FIGURE_CACHE_WARMUP = False
+    config.FIGURE_CACHE_PATH = ''
+    config.CLIENTSIDE_FILTERING = False
+    config.DATASET_RELOAD_INTERVAL = 0
+    config.PRECOMPUTED_RESPONSES = False
+    import app
+    return app
+
+
+# Every filter state as the callbacks' arguments (range_slider, sex_dropdown,
+# volunteer_checkbox, foreign_checkbox, race_dropdown), most likely first
+def filter_states(cube):
+    years = cube.labels['Execution Year']
+    sexes = [None] + [sex for sex in cube.labels['Sex'] if sex is not None]
+    races = [None] + [race for race in cube.labels['Race'] if race is not None]
+
+    states = []
+    for first in years:
+        for last in years[years.index(first):]:
+            moved = (first != years[0]) + (last != years[-1])
+            for sex in sexes:
+                for volunteer in [[], ['yes']]:
+                    for foreign in [[], ['Yes']]:
+                        for race in races:
+                            chosen = (sex is not None) + bool(volunteer) + bool(foreign) + (race is not None)
+                            likelihood = (chosen, moved, first - last)
+                            states.append((likelihood, ([first, last], sex, volunteer, foreign, race)))
+    states.sort(key=lambda state: state[0])
+    return [state for _, state in states]
+
+
+# (graph id, callback arguments) of every chart response of the first `limit` filter states.
+# Only the map depends on the race, so the other charts are rendered once per state without it
+def chart_requests(app, limit=None):
+    requests = []
+    for range_slider, sex, volunteer, foreign, race in filter_states(app.cube)[:limit or None]:
+        for graph_id, _, inputs in app.figure_callbacks:
+            if len(inputs) == 5:
+                requests.append((graph_id, (range_slider, sex, volunteer, foreign, race)))
+            elif race is None:
+                requests.append((graph_id, (range_slider, sex, volunteer, foreign)))
+    return requests
+
+
+# Render a batch of chart requests in a pool worker: their store keys and gzipped responses
+def render(batch):
+    app = load_app()
+    callbacks = {graph_id: callback for graph_id, callback, _ in app.figure_callbacks}
+    rendered = []
+    for graph_id, args in batch:
+        body = to_json_plotly({'multi': True, 'response': {graph_id: {'figure': callbacks[graph_id](*args)}}})
+        rendered.append((state_key(graph_id, app.filter_key(*args)), gzip.compress(body.encode(), 9)))
+    return rendered
+
+
+def open_store(path):
+    conn = sqlite3.connect(path, timeout=30)
+    # Servers read the store while the job is still writing it
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body BLOB NOT NULL) WITHOUT ROWID')
+    return conn
+
+
+# Render the responses missing from the store of the current dataset and return its path
+def precompute(workers=None, limit=None, cache_dir=None):
+    cache_dir = config.DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        raise ValueError('Precomputing needs the dataset cache (DATASET_CACHE_DIR is empty)')
+    app = load_app()
+    path = store_path(app.df.attrs['version'], cache_dir)
+
+    # Stores of other dataset versions or of older code are never read again
+    for other in glob.glob(os.path.join(cache_dir, 'responses-v*.sqlite*')):
+        if not other.startswith(path):
+            os.remove(other)
+
+    conn = open_store(path)
+    done = {key for key, in conn.execute('SELECT key FROM responses')}
+    pending = [(graph_id, args) for graph_id, args in chart_requests(app, limit)
+               if state_key(graph_id, app.filter_key(*args)) not in done]
+    print(f'{path}: {len(done)} responses stored, {len(pending)} to render')
+
+    batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+    with concurrent.futures.ProcessPoolExecutor(workers or os.cpu_count(), initializer=load_app) as pool:
+        futures = [pool.submit(render, batch) for batch in batches]
+        for i, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            # One transaction per batch: an interrupted run keeps everything written so far
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?)', future.result())
+            if i % 50 == 0 or i == len(batches):
+                print(f'{i}/{len(batches)} batches')
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render the chart responses of every filter state')
+    parser.add_argument('--workers', type=int, default=config.PRECOMPUTE_WORKERS or None,
+                        help='worker processes, PRECOMPUTE_WORKERS or the number of CPUs by default')
+    parser.add_argument('--limit', type=int, default=config.PRECOMPUTE_LIMIT,
+                        help='render only this many of the most likely filter states (0: all of them)')
+    parser.add_argument('--cache-dir', help='dataset cache directory, DATASET_CACHE_DIR by default')
+    args = parser.parse_args()
+    precompute(args.workers, args.limit, args.cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# Import packages
+import functools
+import hashlib
+import os
+
+import flask
+
+### STATIC FILES
+# Long-lived browser caching of the assets and Dash bundles. Their URLs carry a fingerprint
+# that changes with the file: Dash appends `?m=<modification time>` to the CSS and JS it
+# includes from assets/, bundles have the package version in their path, and other assets
+# (images) are linked with `asset_url`, which appends a hash of their contents. A fingerprinted
+# URL always serves the same bytes, so browsers may keep it for a year without revalidating.
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@functools.lru_cache(maxsize=None)
+def fingerprint(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+# Fingerprinted URL of the file `name` in the assets folder of `app`
+def asset_url(app, name):
+    path = os.path.join(app.config.assets_folder, name)
+    return f'{app.get_asset_url(name)}?m={fingerprint(path, os.path.getmtime(path))}'
+
+
+# Mark the fingerprinted responses of `app` as immutable
+def init_app(app):
+    assets_prefix = app.get_asset_url('')
+
+    @app.server.after_request
+    def cache_static(response):
+        path = flask.request.path
+        if response.status_code == 200 and (
+                (path.startswith(assets_prefix) and 'm' in flask.request.args)
+                or (path.startswith('/_dash-component-suites/') and response.cache_control.max_age)):
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
@@ -0,0 +1,103 @@
+# Import packages
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+### COLUMNAR STORE
+# Append-only, column-per-file store for the cleaned dataset. Every column is a raw binary
+# file of fixed-width values: categoricals as their codes (the categories are fixed by the
+# schema, so codes mean the same thing in every chunk), datetimes as int64 and integers as
+# themselves. meta.json holds the column types and the number of committed rows.
+#
+# Appending writes the new values at the end of every column file and only then commits the
+# new row count in meta.json, with an atomic rename. Readers memory-map the committed rows
+# only, so they always see a consistent prefix of the data even while rows are appended.
+
+
+class ColumnStore:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+    # Create an empty store at `path` for the columns and types of `schema` (see dataset.schema)
+    @classmethod
+    def create(cls, path, schema, attrs=None):
+        os.makedirs(path, exist_ok=True)
+        columns = []
+        for i, (name, kind) in enumerate(schema.items()):
+            entry = {'name': name, 'file': f'{i}.bin'}
+            if isinstance(kind, list):
+                entry['type'] = 'category'
+                entry['categories'] = kind
+                entry['dtype'] = 'int8' if len(kind) < 128 else 'int16'
+            elif kind.startswith('datetime64'):
+                entry['type'] = kind
+                entry['dtype'] = 'int64'
+            else:
+                entry['type'] = kind
+                entry['dtype'] = kind
+            open(os.path.join(path, entry['file']), 'wb').close()
+            columns.append(entry)
+        store = cls.__new__(cls)
+        store.path = path
+        store.meta = {'rows': 0, 'columns': columns, 'attrs': attrs or {}}
+        store.commit()
+        return store
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def attrs(self):
+        return self.meta['attrs']
+
+    def commit(self):
+        tmp = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+    # Append the rows of `df`, a frame following the store's schema, and update the stored
+    # attrs with `attrs` in the same commit
+    def append(self, df, attrs=None):
+        for entry in self.meta['columns']:
+            series = df[entry['name']]
+            if entry['type'] == 'category':
+                values = pd.Categorical(series, categories=entry['categories']).codes
+            elif entry['type'].startswith('datetime64'):
+                values = series.to_numpy().astype(entry['type']).view('int64')
+            else:
+                values = series.to_numpy()
+            with open(os.path.join(self.path, entry['file']), 'r+b') as f:
+                # Write at the end of the committed rows: leftovers of an append that never
+                # committed are overwritten
+                f.seek(self.rows * np.dtype(entry['dtype']).itemsize)
+                f.write(np.ascontiguousarray(values, dtype=entry['dtype']).tobytes())
+                f.truncate()
+        self.meta['rows'] += len(df)
+        self.meta['attrs'].update(attrs or {})
+        self.commit()
+
+    # The committed rows as a DataFrame whose columns are memory-mapped from the column files
+    def read(self):
+        columns = {}
+        for entry in self.meta['columns']:
+            filename = os.path.join(self.path, entry['file'])
+            if self.rows:
+                values = np.memmap(filename, dtype=entry['dtype'], mode='r', shape=(self.rows,))
+            else:
+                values = np.empty(0, dtype=entry['dtype'])
+            if entry['type'] == 'category':
+                columns[entry['name']] = pd.Categorical.from_codes(values, categories=entry['categories'])
+            elif entry['type'].startswith('datetime64'):
+                columns[entry['name']] = values.view(entry['type'])
+            else:
+                columns[entry['name']] = values
+        df = pd.DataFrame(columns, copy=False)
+        df.attrs.update(self.meta['attrs'])
+        return df
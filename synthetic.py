@@ -0,0 +1,78 @@
+# Generate a synthetic executions CSV of any size for load testing, in the raw schema that
+# dataset.py reads.
+#
+#   python synthetic.py ROWS [-o synthetic.csv] [--chunk-size 100000] [--seed 0] [--source CSV]
+#
+# Rows are drawn with replacement from the source CSV (the bundled one by default), so the
+# joint distribution of state, region, year, race, sex, the other flags and the victim
+# columns is the one of the real data, raw spellings included (' Male', 'White ', 'no') so
+# the cleaning steps have the same work to do. Each row then gets a random execution date
+# within its year and names drawn independently from the source, so no row is a copy of a
+# real person. Output is written one chunk at a time, so memory does not grow with ROWS.
+
+# Import packages
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import config
+
+CHUNK_SIZE = 100_000
+
+name_columns = ['First Name', 'Middle Name(s)', 'Last Name', 'Suffix']
+
+
+# Random dates within the given years, formatted like the source (m/d/yy, no padding)
+def random_dates(years, rng):
+    first = (years - 1970).astype('datetime64[Y]')
+    start = first.astype('datetime64[D]')
+    days = ((first + 1).astype('datetime64[D]') - start).astype(np.int64)
+    dates = pd.DatetimeIndex(start + (rng.random(len(years)) * days).astype(np.int64))
+    return (dates.month.astype(str) + '/' + dates.day.astype(str) + '/'
+            + (dates.year % 100).astype(str).str.zfill(2)).to_numpy()
+
+
+# Yield DataFrames of at most `chunk_size` synthetic rows, `rows` in total
+def generate(rows, source=None, chunk_size=CHUNK_SIZE, seed=0):
+    # Read as text so every value is written back exactly as it appears in the source
+    sample = pd.read_csv(config.DATASET_SOURCE if source is None else source, dtype=str, keep_default_na=False)
+    years = pd.to_datetime(sample['Execution Date'], format='%m/%d/%y').dt.year.to_numpy()
+    names = {col: sample[col].to_numpy() for col in name_columns}
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        index = rng.integers(0, len(sample), size)
+        chunk = sample.iloc[index].reset_index(drop=True)
+        chunk['Execution Date'] = random_dates(years[index], rng)
+        for col in name_columns:
+            chunk[col] = rng.choice(names[col], size)
+        yield chunk
+
+
+# Write `rows` synthetic rows as CSV to `path` ('-' for stdout)
+def write(path, rows, **kwargs):
+    f = sys.stdout if path == '-' else open(path, 'w', newline='')
+    try:
+        for i, chunk in enumerate(generate(rows, **kwargs)):
+            chunk.to_csv(f, header=i == 0, index=False)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic executions CSV for load testing')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('-o', '--output', default='-', help="output CSV, '-' for stdout")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source', help='CSV to draw rows from, DATASET_SOURCE by default')
+    args = parser.parse_args()
+    write(args.output, args.rows, source=args.source, chunk_size=args.chunk_size, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
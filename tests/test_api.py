@@ -0,0 +1,92 @@
+# Import packages
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import api
+import app
+
+
+@pytest.fixture
+def client():
+    return app.server.test_client()
+
+
+def test_list_aggregates(client):
+    response = client.get('/api/aggregates')
+    assert response.status_code == 200
+    assert set(response.get_json()) == set(api.aggregates)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/aggregates/race-year?years=1990-2000-2010',
+    '/api/aggregates/race-year?years=soon',
+    '/api/aggregates/race-year?sex=Other',
+    '/api/aggregates/race-year?volunteer=maybe',
+    '/api/aggregates/race-year?format=xml',
+    '/api/executions?race=Martian',
+])
+def test_bad_query(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_unknown_aggregate(client):
+    assert client.get('/api/aggregates/nothing').status_code == 404
+
+
+@pytest.mark.parametrize('url', ['/api/aggregates/sex-race?years=1990-2000', '/api/executions?sex=Female'])
+def test_matching_etag_gives_not_modified(client, url):
+    response = client.get(url)
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert client.get(url + '&race=White', headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('url', ['/api/aggregates/year-region', '/api/executions?years=1990-2010'])
+def test_gzip_body_decodes_to_the_plain_body(client, url):
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert json.loads(gzip.decompress(compressed.data)) == json.loads(plain.data)
+
+
+def test_body_describes_the_snapshot(client):
+    body = client.get('/api/aggregates/race-region').get_json()
+    assert body['aggregate'] == 'race-region'
+    assert body['version'] == app.snapshot[1].version
+    assert body['columns'] == ['Race', 'Region', 'Executions']
+
+
+@pytest.mark.parametrize('output', ['json', 'csv'])
+def test_streamed_in_chunks(client, monkeypatch, output):
+    url = f'/api/aggregates/race-year?format={output}'
+    whole = client.get(url).data
+    monkeypatch.setattr(api, 'ROWS_PER_CHUNK', 7)
+    response = client.get(url)
+    assert response.is_streamed
+    assert response.data == whole
+
+
+def test_executions_are_the_matching_rows(client, monkeypatch):
+    monkeypatch.setattr(api, 'ROWS_PER_CHUNK', 50)
+    body = client.get('/api/executions?years=1990-2005&race=White&volunteer=yes').get_json()
+    df = app.df
+    mask = ((df['Execution Year'] >= 1990) & (df['Execution Year'] <= 2005) & (df['Race'] == 'White')
+            & (df['Execution Volunteer'] == 'yes'))
+    assert body['columns'] == list(df.columns)
+    assert len(body['data']) == mask.sum() > 50
+    year = body['columns'].index('Execution Year')
+    np.testing.assert_array_equal([row[year] for row in body['data']], df.loc[mask, 'Execution Year'])
+    date = body['columns'].index('Execution Date')
+    assert body['data'][0][date] == df.loc[mask, 'Execution Date'].iloc[0].strftime('%Y-%m-%d')
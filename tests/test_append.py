@@ -0,0 +1,85 @@
+# Import packages
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import append as appender
+import config
+import dataset
+from append import append
+from cube import Cube, load_cube
+
+# Rows of the bundled CSV (oldest first) in the initial source and in each appended batch
+INITIAL_ROWS = 400
+BATCH_ROWS = 300
+
+
+@pytest.fixture
+def source(tmp_path):
+    with open(config.DATASET_SOURCE) as f:
+        header, *lines = f.read().splitlines()
+    batches = [lines[:INITIAL_ROWS], lines[INITIAL_ROWS:INITIAL_ROWS + BATCH_ROWS],
+               lines[INITIAL_ROWS + BATCH_ROWS:INITIAL_ROWS + 2 * BATCH_ROWS]]
+    paths = []
+    for i, batch in enumerate(batches):
+        path = tmp_path / f'batch{i}.csv'
+        path.write_text('\n'.join([header] + batch))
+        paths.append(str(path))
+    return paths[0], paths[1:], str(tmp_path / 'cache')
+
+
+def test_reload_after_appends(source):
+    filename, batches, cache_dir = source
+    booted_before = dataset.load(filename, cache_dir)
+    append(batches[0], filename, cache_dir)
+    # Boots after an append find the store through an alias that the next append removes
+    booted_between = dataset.load(filename, cache_dir)
+    assert len(booted_between) == INITIAL_ROWS + BATCH_ROWS
+    append(batches[1], filename, cache_dir)
+
+    expected = dataset.load(filename, '')
+    for df in (booted_before, booted_between):
+        updated = dataset.reload(df)
+        assert updated is not None
+        pd.testing.assert_frame_equal(updated.copy(), expected, check_like=True)
+        assert dataset.reload(updated) is None
+    pd.testing.assert_frame_equal(dataset.load(filename, cache_dir).copy(), expected, check_like=True)
+
+
+def test_boot_while_the_source_grows_shares_the_store(source, monkeypatch):
+    filename, batches, cache_dir = source
+    booted_before = dataset.load(filename, cache_dir)
+    grow_source = appender.grow_source
+    booted = {}
+
+    def grow_and_boot(path, raw):
+        # Workers booting on either side of the write to the source
+        booted['before'] = dataset.load(filename, cache_dir)
+        grow_source(path, raw)
+        booted['after'] = dataset.load(filename, cache_dir)
+
+    monkeypatch.setattr(appender, 'grow_source', grow_and_boot)
+    append(batches[0], filename, cache_dir)
+    monkeypatch.undo()
+    append(batches[1], filename, cache_dir)
+
+    store = os.path.realpath(booted_before.attrs['store'])
+    for df in booted.values():
+        assert len(df) == INITIAL_ROWS + BATCH_ROWS
+        assert df.attrs['store'] == store
+        assert len(dataset.reload(df)) == INITIAL_ROWS + 2 * BATCH_ROWS
+
+
+def test_appended_cube_matches_rebuilt_cube(source):
+    filename, batches, cache_dir = source
+    dataset.load(filename, cache_dir)
+    for batch in batches:
+        append(batch, filename, cache_dir)
+
+    appended = load_cube(dataset.load(filename, cache_dir), cache_dir)
+    rebuilt = Cube.from_frame(dataset.load(filename, ''))
+    assert appended.labels == rebuilt.labels
+    assert appended.state_names == rebuilt.state_names
+    np.testing.assert_array_equal(appended.values, rebuilt.values)
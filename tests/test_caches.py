@@ -0,0 +1,36 @@
+# Import packages
+import numpy as np
+
+from cube import Cube, SubcubeCache
+from figure_cache import FigureCache
+
+
+def test_figure_built_during_reset_is_not_kept():
+    cache = FigureCache(version='v1')
+
+    def build():
+        # A reload switches the dataset while this figure is built from the old one
+        cache.reset('v2')
+        return {'data': 'old'}
+
+    assert cache.get('linechart', build) == {'data': 'old'}
+    assert cache.get('linechart', lambda: {'data': 'new'}) == {'data': 'new'}
+
+
+def test_subcube_cache_is_bounded_by_bytes():
+    cache = SubcubeCache(maxbytes=3000)
+    built = []
+
+    def build(key):
+        built.append(key)
+        return Cube(np.zeros(250, dtype=np.int32), {})
+
+    for key in range(4):
+        cache.get(key, lambda: build(key))
+    assert cache.nbytes == 3000
+    assert list(cache.entries) == [1, 2, 3]
+
+    # Views of a shared (memory-mapped) cube don't count
+    shared = np.zeros(1000, dtype=np.int32)
+    cache.get('view', lambda: Cube(shared[:500], {}))
+    assert cache.nbytes == 3000 and 'view' in cache.entries
@@ -0,0 +1,121 @@
+# Import packages
+import gzip
+import json
+import re
+
+import flask
+import pytest
+
+import app
+import compression
+import config
+import static_files
+
+# brotli is optional (not in requirements.txt): without it, clients asking for br get gzip
+needs_brotli = pytest.mark.skipif(compression.brotli is None, reason='brotli is not installed')
+
+
+def negotiated(accept_encoding):
+    with flask.Flask(__name__).test_request_context(headers={'Accept-Encoding': accept_encoding}):
+        return compression.negotiate(flask.request)
+
+
+@needs_brotli
+def test_negotiate_prefers_brotli():
+    assert negotiated('gzip, deflate, br') == 'br'
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('identity', None),
+    ('', None),
+    ('gzip;q=0', None),
+])
+def test_negotiate(accept_encoding, expected):
+    assert negotiated(accept_encoding) == expected
+
+
+def test_negotiate_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert negotiated('gzip, deflate, br') == 'gzip'
+    assert negotiated('br') is None
+
+
+@pytest.fixture
+def client():
+    server = flask.Flask(__name__)
+    compression.init_app(server)
+
+    @server.route('/<int:size>')
+    def body(size):
+        return flask.jsonify({'data': 'x' * size})
+
+    return server.test_client()
+
+
+def test_large_body_is_compressed(client):
+    response = client.get('/5000', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == {'data': 'x' * 5000}
+
+
+def test_small_body_is_not_compressed(client):
+    response = client.get('/10', headers={'Accept-Encoding': 'gzip'})
+    assert len(response.data) < config.COMPRESS_MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+    # The client that accepts gzip may still get a compressed body for a larger answer
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_identity_is_not_compressed(client):
+    response = client.get('/5000', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.get_json() == {'data': 'x' * 5000}
+
+
+@needs_brotli
+def test_brotli_body(client):
+    response = client.get('/5000', headers={'Accept-Encoding': 'br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(compression.brotli.decompress(response.data)) == {'data': 'x' * 5000}
+
+
+@pytest.fixture
+def page():
+    client = app.server.test_client()
+    return client, re.findall(r'(?:src|href)="([^"]+)"', client.get('/').get_data(as_text=True))
+
+
+def test_fingerprinted_bundles_are_immutable(page):
+    client, urls = page
+    bundles = [url for url in urls if url.startswith('/_dash-component-suites/')]
+    assert bundles
+    for url in bundles:
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == static_files.IMMUTABLE
+
+
+def test_fingerprinted_assets_are_immutable(page):
+    client, urls = page
+    assets = [url for url in urls if url.startswith('/assets/')]
+    assert assets and all('?m=' in url for url in assets)
+    for url in assets:
+        assert client.get(url).headers['Cache-Control'] == static_files.IMMUTABLE
+    logo = static_files.asset_url(app.app, 'logo.png')
+    assert client.get(logo).headers['Cache-Control'] == static_files.IMMUTABLE
+
+
+def test_unfingerprinted_urls_are_revalidated(page):
+    client, urls = page
+    bundle = next(url for url in urls if url.startswith('/_dash-component-suites/'))
+    # The same file without the version and modification time Dash puts in its name
+    plain = re.sub(r'\.v[0-9_]+m[0-9]+', '', bundle)
+    for url in [plain, '/assets/logo.png']:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'immutable' not in response.headers.get('Cache-Control', '')
@@ -0,0 +1,74 @@
+# Import packages
+import pandas as pd
+import pytest
+
+import dataset
+from cube import Cube, victims_columns
+
+# Grouping of every chart, as the callback computed it with pandas before the cube
+charts = {
+    'choropleth_map': ['State Code'],
+    'nested_pie_chart': ['Sex', 'Race'],
+    'linechart': ['Race', 'Execution Year'],
+    'matrix': ['Race'],
+    'scatter_fig': ['Execution Year', 'Region'],
+    'stackedBar': ['Race', 'Region'],
+}
+
+# (years, sex, volunteer, foreign, race) as set with the dashboard's controls
+states = [
+    ((1977, 2023), None, False, False, None),
+    ((1990, 2000), None, False, False, None),
+    ((1977, 2023), 'Female', False, False, None),
+    ((1977, 2023), None, True, False, 'White'),
+    ((1995, 2015), 'Male', False, True, None),
+    ((2000, 2023), 'Male', True, False, 'Black'),
+]
+
+
+@pytest.fixture(scope='module')
+def df():
+    return dataset.df
+
+
+@pytest.fixture(scope='module')
+def cube(df):
+    return Cube.from_frame(df)
+
+
+# The rows the old callback filtered with chained masks
+def filtered(df, years, sex, volunteer, foreign, race):
+    rows = df[(df['Execution Year'] >= years[0]) & (df['Execution Year'] <= years[1])]
+    if sex:
+        rows = rows[rows['Sex'] == sex]
+    if volunteer:
+        rows = rows[rows['Execution Volunteer'] == 'yes']
+    if foreign:
+        rows = rows[rows['Foreign National'] == 'Yes']
+    if race:
+        rows = rows[rows['Race'] == race]
+    return rows
+
+
+def normalized(frame, keep):
+    frame = frame.astype({dim: str for dim in keep})
+    return frame.sort_values(keep).reset_index(drop=True).astype({col: 'int64' for col in frame.columns if col not in keep})
+
+
+@pytest.mark.parametrize('chart', charts)
+@pytest.mark.parametrize('state', states)
+def test_cube_frame_matches_groupby(df, cube, chart, state):
+    keep = charts[chart]
+    years, sex, volunteer, foreign, race = state
+    grouped = filtered(df, *state).groupby(keep, observed=True)
+    expected = grouped.size().rename('Executions').to_frame().join(grouped[victims_columns].sum()).reset_index()
+
+    actual = cube.select(years, {
+        'Sex': sex,
+        'Execution Volunteer': 'yes' if volunteer else None,
+        'Foreign National': 'Yes' if foreign else None,
+        'Race': race,
+    }).frame(keep)
+    # groupby leaves out the rows without a value (federal executions have no state code)
+    actual = actual.dropna(subset=keep)
+    pd.testing.assert_frame_equal(normalized(actual, keep), normalized(expected, keep))
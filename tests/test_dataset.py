@@ -0,0 +1,58 @@
+# Import packages
+import functools
+import http.server
+import os
+import shutil
+import threading
+
+import pytest
+
+import config
+import dataset
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'source.csv'
+    shutil.copy(config.DATASET_SOURCE, path)
+    return str(path), str(tmp_path / 'cache')
+
+
+def test_warm_boot_does_not_hash_the_source(source, monkeypatch):
+    filename, cache_dir = source
+    version = dataset.load(filename, cache_dir).attrs['version']
+
+    def hashed(filename):
+        raise AssertionError('source hashed again')
+
+    monkeypatch.setattr(dataset, 'dataset_version', hashed)
+    assert dataset.load(filename, cache_dir).attrs['version'] == version
+
+
+def test_changed_source_is_hashed_again(source):
+    filename, cache_dir = source
+    before = dataset.load(filename, cache_dir)
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines[:-1]))
+    after = dataset.load(filename, cache_dir)
+    assert after.attrs['version'] != before.attrs['version']
+    assert len(after) == len(before) - 1
+
+
+def test_remote_source_boots_offline_from_the_cache(source):
+    filename, cache_dir = source
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=os.path.dirname(filename))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/source.csv'
+    try:
+        online = dataset.load(url, cache_dir)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    offline = dataset.load(url, cache_dir)
+    assert offline.attrs['version'] == online.attrs['version']
+    assert len(offline) == len(online)
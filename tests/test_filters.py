@@ -0,0 +1,49 @@
+# Import packages
+import numpy as np
+import pytest
+
+import dataset
+from filters import FilterEngine
+
+# (years, filters) as passed to FilterEngine.select and Cube.select
+states = [
+    (None, {}),
+    (None, {'Sex': None, 'Race': '', 'Execution Volunteer': None, 'Foreign National': None}),
+    ((1977, 2023), {}),
+    ((1990, 2000), {'Sex': 'Female'}),
+    ((1990, 2000), {'Race': 'Black', 'Execution Volunteer': 'yes'}),
+    ((2000, 2023), {'Foreign National': 'Yes', 'Region': 'South'}),
+    ((1977, 2023), {'State Code': 'TX', 'Sex': 'Male', 'Race': 'White'}),
+    ((1850, 1900), {}),
+    ((2030, 2040), {'Sex': 'Male'}),
+    ((2010, 1990), {}),
+    (None, {'Sex': 'Other'}),
+]
+
+
+@pytest.fixture(scope='module')
+def df():
+    return dataset.df
+
+
+@pytest.fixture(scope='module')
+def engine(df):
+    return FilterEngine(df)
+
+
+# The chained boolean masks the engine replaced
+def masked(df, years, filters):
+    mask = np.ones(len(df), dtype=bool)
+    if years is not None:
+        mask &= ((df['Execution Year'] >= years[0]) & (df['Execution Year'] <= years[1])).to_numpy()
+    for col, value in filters.items():
+        if value:
+            mask &= (df[col] == value).to_numpy()
+    return np.flatnonzero(mask)
+
+
+@pytest.mark.parametrize('years, filters', states)
+def test_select_matches_masks(df, engine, years, filters):
+    expected = masked(df, years, filters)
+    np.testing.assert_array_equal(engine.select(years, filters), expected)
+    assert engine.count(years, filters) == len(expected)